@@ -3,17 +3,55 @@ FloxAI Chat API - Flox-aware conversation endpoints
 """
 import time
 import uuid
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.db.database import save_chat_message, get_chat_history, save_feedback, get_flox_stats
+from app.services.llm_service import CLAUDE_MODEL, STATIC_FLOX_SYSTEM, FloxLLMService, build_prompt
+from app.services.rag_service import FloxRAGService
 from app.services.learning_service import FloxLearningService
-from app.core.config import get_settings
+from app.core.config import SETTINGS
 
 router = APIRouter()
 
+# Service providers - the instances are created once in the app lifespan
+def get_rag_service(request: Request) -> FloxRAGService:
+    return request.app.state.rag_service
+
+def get_llm_service(request: Request) -> FloxLLMService:
+    return request.app.state.llm_service
+
+def get_learning_service(request: Request) -> FloxLearningService:
+    return request.app.state.learning_service
+
+# Shown while Claude isn't configured; rendered once since settings are static
+STARTUP_MSG = """FloxAI is starting up! 🚀
+
+I'm your Flox development co-pilot, designed to help you master Flox and showcase its incredible capabilities.
+
+**To get started:**
+1. Make sure you have set your CLAUDE_API_KEY: `export CLAUDE_API_KEY=your_key_here`
+2. Restart FloxAI: `floxybotdev`
+
+**What I can help with:**
+- 🔧 Creating and optimizing manifest.toml files
+- 🌍 Cross-platform environment setup
+- 📦 Package management and dependencies  
+- 🚀 Service orchestration
+- 🐳 Converting from Docker to Flox
+- 💡 Flox best practices and troubleshooting
+
+**Current Flox Environment:**
+- Name: {settings.flox_env_name}
+- Project: {settings.flox_project_dir}
+- Platform: Running on Flox! 🎉
+
+Try asking me: "How do I add Python packages to my Flox environment?" or "Show me a manifest.toml example for a web app"
+            """.format(settings=SETTINGS)
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -27,98 +65,150 @@ class ChatResponse(BaseModel):
     model: str = "claude-3-sonnet-20240229"
     response_time: float
     flox_info: dict = {}
+    cache_read_input_tokens: int = 0
 
 class FeedbackRequest(BaseModel):
     message_id: int
     session_id: str
     worked: bool = False
 
-@router.post("/query", response_model=ChatResponse)
-async def chat_query(request: ChatRequest, app_request: Request):
+# Characters of each source's content sent to the client (the UI shows 200)
+SOURCE_PREVIEW_CHARS = 200
+
+def _slim_sources(sources: List[dict]) -> List[dict]:
+    """Keep only the top sources and the fields the client renders"""
+    return [
+        {
+            "source": source.get("source", "Unknown"),
+            "title": source.get("title", ""),
+            "doc_type": source.get("doc_type", "general"),
+            "relevance_score": source.get("relevance_score", 0.0),
+            "content": source.get("content", "")[:SOURCE_PREVIEW_CHARS],
+        }
+        for source in sources[:3]
+    ]
+
+@router.post("/query", response_model=ChatResponse, response_model_exclude_unset=True)
+async def chat_query(
+    request: ChatRequest,
+    rag_service: FloxRAGService = Depends(get_rag_service),
+    llm_service: FloxLLMService = Depends(get_llm_service)
+):
     """Main chat endpoint with Flox awareness"""
     start_time = time.time()
     
     try:
-        settings = get_settings()
-        
-        # Get services from app state
-        rag_service = getattr(app_request.app.state, 'rag_service', None)
-        llm_service = getattr(app_request.app.state, 'llm_service', None)
-        
         # Generate session ID if not provided
         session_id = request.session_id or str(uuid.uuid4())
         
         # Save user message
-        save_chat_message(session_id, "user", request.message)
+        await save_chat_message(session_id, "user", request.message)
         
         # Get context from RAG if available
         context = ""
         sources = []
-        if rag_service and rag_service.is_ready:
+        if rag_service.is_ready:
             context, sources = await rag_service.get_context_for_query(request.message)
+            sources = _slim_sources(sources)
         
         # Generate response
-        if llm_service and llm_service.is_ready:
+        cache_read_input_tokens = 0
+        if llm_service.is_ready:
+            system_prefix, user_suffix = build_prompt(STATIC_FLOX_SYSTEM, context, request.message)
             llm_response = await llm_service.chat_with_context(
-                user_message=request.message,
-                context=context
+                system_prefix=system_prefix,
+                user_suffix=user_suffix
             )
             response_text = llm_response["response"]
             model = llm_response.get("model", "claude-3-sonnet-20240229")
+            cache_read_input_tokens = llm_response.get("usage", {}).get("cache_read_input_tokens", 0)
         else:
-            response_text = """FloxAI is starting up! 🚀
-
-I'm your Flox development co-pilot, designed to help you master Flox and showcase its incredible capabilities.
-
-**To get started:**
-1. Make sure you have set your CLAUDE_API_KEY: `export CLAUDE_API_KEY=your_key_here`
-2. Restart FloxAI: `floxybotdev`
-
-**What I can help with:**
-- 🔧 Creating and optimizing manifest.toml files
-- 🌍 Cross-platform environment setup
-- 📦 Package management and dependencies  
-- 🚀 Service orchestration
-- 🐳 Converting from Docker to Flox
-- 💡 Flox best practices and troubleshooting
-
-**Current Flox Environment:**
-- Name: {settings.flox_env_name}
-- Project: {settings.flox_project_dir}
-- Platform: Running on Flox! 🎉
-
-Try asking me: "How do I add Python packages to my Flox environment?" or "Show me a manifest.toml example for a web app"
-            """.format(settings=settings)
+            response_text = STARTUP_MSG
             model = "floxai-local"
         
         response_time = time.time() - start_time
         
         # Save assistant message
-        message_id = save_chat_message(
+        message_id = await save_chat_message(
             session_id, "assistant", response_text, model, response_time
         )
         
         # Get Flox environment info
-        flox_info = settings.get_flox_info()
+        flox_info = SETTINGS.flox_info
         
         return ChatResponse(
             response=response_text,
             session_id=session_id,
             message_id=message_id,
-            sources=sources[:3],
+            sources=sources,
             model=model,
             response_time=response_time,
-            flox_info=flox_info
+            flox_info=flox_info,
+            cache_read_input_tokens=cache_read_input_tokens
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"FloxAI chat error: {str(e)}")
 
+@router.post("/query/stream")
+async def chat_query_stream(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    rag_service: FloxRAGService = Depends(get_rag_service),
+    llm_service: FloxLLMService = Depends(get_llm_service)
+):
+    """Streaming chat endpoint - flushes response text as Claude generates it"""
+    start_time = time.time()
+    
+    try:
+        session_id = request.session_id or str(uuid.uuid4())
+        await save_chat_message(session_id, "user", request.message)
+        
+        context = ""
+        if rag_service.is_ready:
+            context, _ = await rag_service.get_context_for_query(request.message)
+        
+        if llm_service.is_ready:
+            system_prefix, user_suffix = build_prompt(STATIC_FLOX_SYSTEM, context, request.message)
+            token_stream = llm_service.stream_chat_with_context(system_prefix, user_suffix)
+            model = CLAUDE_MODEL
+        else:
+            token_stream = _single_chunk(STARTUP_MSG)
+            model = "floxai-local"
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"FloxAI chat error: {str(e)}")
+    
+    response_chunks: List[str] = []
+    
+    async def body() -> AsyncIterator[str]:
+        async for text in token_stream:
+            response_chunks.append(text)
+            yield text
+    
+    # Background tasks run once the stream has been fully sent
+    background_tasks.add_task(_save_streamed_reply, session_id, response_chunks, model, start_time)
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Session-Id": session_id, "X-Model": model},
+        background=background_tasks
+    )
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+async def _save_streamed_reply(session_id: str, chunks: List[str], model: str, start_time: float):
+    """Persist a streamed assistant reply once it is complete"""
+    await save_chat_message(
+        session_id, "assistant", "".join(chunks), model, time.time() - start_time
+    )
+
 @router.post("/feedback")
 async def submit_feedback(feedback: FeedbackRequest):
     """Submit feedback for learning"""
     try:
-        save_feedback(
+        await save_feedback(
             session_id=feedback.session_id,
             message_id=feedback.message_id,
             query_text="",  # Simplified for MVP
@@ -133,7 +223,7 @@ async def submit_feedback(feedback: FeedbackRequest):
 async def get_session_history(session_id: str):
     """Get chat history"""
     try:
-        history = get_chat_history(session_id)
+        history = await get_chat_history(session_id)
         return {"session_id": session_id, "messages": history}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -142,35 +232,32 @@ async def get_session_history(session_id: str):
 async def get_flox_environment_stats():
     """Get Flox-specific statistics and environment info"""
     try:
-        return get_flox_stats()
+        return await get_flox_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/learning/insights")
-async def get_learning_insights():
+async def get_learning_insights(learning_service: FloxLearningService = Depends(get_learning_service)):
     """Get learning insights from user feedback"""
     try:
-        learning_service = FloxLearningService()
         insights = learning_service.generate_learning_insights()
         return insights
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/learning/update")
-async def update_knowledge_from_feedback():
+async def update_knowledge_from_feedback(learning_service: FloxLearningService = Depends(get_learning_service)):
     """Update knowledge base based on feedback patterns"""
     try:
-        learning_service = FloxLearningService()
         summary = learning_service.update_knowledge_base_from_feedback()
         return summary
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/learning/stats")
-async def get_learning_stats():
+async def get_learning_stats(learning_service: FloxLearningService = Depends(get_learning_service)):
     """Get learning statistics"""
     try:
-        learning_service = FloxLearningService()
         stats = learning_service.get_learning_stats()
         return stats
     except Exception as e:
@@ -2,13 +2,19 @@
 FloxAI Configuration - Optimized for Flox environments
 """
 import os
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from pathlib import Path
 from typing import Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
+# Well-known project files reported in context-aware mode
+COMMON_PROJECT_FILES = (
+    "package.json", "requirements.txt", "pyproject.toml", 
+    "Cargo.toml", "go.mod", "Dockerfile", "docker-compose.yml",
+    "Makefile", "CMakeLists.txt", "build.gradle", "pom.xml"
+)
 
 class Settings(BaseSettings):
     """FloxAI settings - Flox-environment aware"""
@@ -42,6 +48,19 @@ class Settings(BaseSettings):
     rag_chunk_size: int = Field(default=500, env="RAG_CHUNK_SIZE")
     rag_chunk_overlap: int = Field(default=50, env="RAG_CHUNK_OVERLAP")
     rag_max_results: int = Field(default=5, env="RAG_MAX_RESULTS")
+    rag_cache_size: int = Field(default=256, env="RAG_CACHE_SIZE")
+    rag_cache_threshold: float = Field(default=0.97, env="RAG_CACHE_THRESHOLD")
+    rag_query_cache_size: int = Field(default=2000, env="RAG_QUERY_CACHE_SIZE")
+    rag_query_cache_ttl: float = Field(default=300.0, env="RAG_QUERY_CACHE_TTL")  # seconds
+    embedding_precision: str = Field(default="fp32", env="EMBEDDING_PRECISION")  # fp32, fp16 (GPU) or int8 (CPU)
+    
+    # Vector store (ChromaDB) configuration
+    chroma_add_batch_size: int = Field(default=200, env="CHROMA_ADD_BATCH_SIZE")
+    chroma_fast_pragmas: bool = Field(default=False, env="CHROMA_FAST_PRAGMAS")  # synchronous=OFF: fast ingest, not crash-safe
+    # HNSW graph parameters; applied when the collection is created (clear it to rebuild)
+    chroma_hnsw_m: int = Field(default=16, env="CHROMA_HNSW_M")
+    chroma_hnsw_construction_ef: int = Field(default=100, env="CHROMA_HNSW_CONSTRUCTION_EF")
+    chroma_hnsw_search_ef: int = Field(default=64, env="CHROMA_HNSW_SEARCH_EF")  # Chroma's default of 10 trades away recall
     
     # LLM Configuration
     llm_temperature: float = Field(default=0.1, env="LLM_TEMPERATURE")
@@ -81,8 +100,9 @@ class Settings(BaseSettings):
         """Check if running in a Flox environment"""
         return bool(os.getenv("FLOX_ENV") or (self.flox_env_name and self.flox_project_dir))
     
-    def get_flox_info(self) -> dict:
-        """Get Flox environment information"""
+    @cached_property
+    def flox_info(self) -> dict:
+        """Flox environment information (static for the life of the process)"""
         # Extract environment name from FLOX_ENV path if FLOX_ENV_NAME is not set
         env_name = self.flox_env_name
         if not env_name and os.getenv("FLOX_ENV"):
@@ -113,8 +133,9 @@ class Settings(BaseSettings):
             }
         }
     
-    def get_context_info(self) -> dict:
-        """Get context-aware information for development mode"""
+    @cached_property
+    def context_info(self) -> dict:
+        """Context-aware information for development mode (computed once)"""
         if not self.context_mode:
             return {"mode": "standalone"}
             
@@ -132,23 +153,27 @@ class Settings(BaseSettings):
             if manifest_path.exists():
                 context["manifest_path"] = str(manifest_path)
         
-        # Detect project files in current directory
+        # Detect project files in current directory (one directory listing)
         if self.flox_project_dir:
-            project_dir = Path(self.flox_project_dir)
-            common_files = [
-                "package.json", "requirements.txt", "pyproject.toml", 
-                "Cargo.toml", "go.mod", "Dockerfile", "docker-compose.yml",
-                "Makefile", "CMakeLists.txt", "build.gradle", "pom.xml"
-            ]
-            
-            for file in common_files:
-                if (project_dir / file).exists():
-                    context["project_files"].append(file)
+            try:
+                with os.scandir(self.flox_project_dir) as entries:
+                    present = {entry.name for entry in entries}
+            except OSError:
+                present = set()
+            context["project_files"] = [f for f in COMMON_PROJECT_FILES if f in present]
         
         return context
+    
+    def refresh_context_info(self):
+        """Drop the cached context info so the next access re-detects project files"""
+        self.__dict__.pop("context_info", None)
 
 
 @lru_cache()
 def get_settings() -> Settings:
     """Get cached settings instance"""
     return Settings()
+
+
+# Eagerly-built settings for hot paths; get_settings() returns the same instance
+SETTINGS: Settings = get_settings()
@@ -1,21 +1,152 @@
 """
 FloxAI Database - Flox-aware data management
 """
+import asyncio
+import logging
 import sqlite3
 import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from app.core.config import get_settings
+from app.core.config import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Inserts are handed to a single writer thread that commits them in batches,
+# keeping the commit/fsync off the request path.
+WRITE_BATCH_SIZE = 64
+WRITE_FLUSH_INTERVAL = 0.02  # seconds
+
+STATS_CACHE_TTL = 5.0  # seconds
+_stats_cache: Optional[Tuple[float, Dict]] = None
+
+_write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+_writer_thread: Optional[threading.Thread] = None
+_writer_start_lock = threading.Lock()
+
+# One long-lived connection shared by every helper. sqlite3 connections are
+# not safe for concurrent use, so all access goes through _conn_lock.
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open an autocommit connection tuned for many small reads and writes"""
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")  # 64 MB page cache
+    return conn
+
+def _get_conn() -> sqlite3.Connection:
+    """Return the shared connection, opening it on first use (hold _conn_lock)"""
+    global _conn
+    if _conn is None:
+        _conn = _connect(SETTINGS.db_path)
+    return _conn
+
+def _flush_writes(batch: List[tuple]):
+    """Commit a batch of queued inserts in one transaction
+    
+    Never raises: every future in the batch is resolved, even if the
+    connection can't be opened, so the writer thread keeps running.
+    """
+    try:
+        with _conn_lock:
+            conn = _get_conn()
+            try:
+                conn.execute("BEGIN")
+                row_ids = [conn.execute(sql, params).lastrowid for sql, params, _ in batch]
+                conn.execute("COMMIT")
+            except Exception:
+                # Not just sqlite3.Error: binding e.g. an out-of-range int raises OverflowError
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                # Retry one by one so a single bad row doesn't fail the whole batch
+                for sql, params, future in batch:
+                    try:
+                        future.set_result(conn.execute(sql, params).lastrowid)
+                    except Exception as e:
+                        future.set_exception(e)
+                return
+    except Exception as e:
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    
+    for (_, _, future), row_id in zip(batch, row_ids):
+        future.set_result(row_id)
+
+def _writer_loop():
+    """Drain the write queue every WRITE_FLUSH_INTERVAL or WRITE_BATCH_SIZE rows"""
+    running = True
+    while running:
+        item = _write_queue.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+        while len(batch) < WRITE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _write_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+        _flush_writes(batch)
+
+def _submit_write(sql: str, params: tuple) -> Future:
+    """Queue an INSERT for the writer thread; the future resolves to its rowid"""
+    global _writer_thread
+    if _writer_thread is None or not _writer_thread.is_alive():
+        with _writer_start_lock:
+            if _writer_thread is None or not _writer_thread.is_alive():
+                _writer_thread = threading.Thread(
+                    target=_writer_loop,
+                    name="floxai-db-writer",
+                    daemon=True
+                )
+                _writer_thread.start()
+    
+    future: Future = Future()
+    _write_queue.put((sql, params, future))
+    return future
+
+def close_db():
+    """Flush pending writes, stop the writer thread and close the connection"""
+    global _writer_thread, _conn
+    if _writer_thread is not None and _writer_thread.is_alive():
+        _write_queue.put(None)
+        _writer_thread.join()
+    _writer_thread = None
+    
+    with _conn_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
 
 def init_db():
     """Initialize the database with Flox environment info"""
-    settings = get_settings()
+    settings = SETTINGS
     db_path = Path(settings.db_path)
     db_path.parent.mkdir(parents=True, exist_ok=True)
     
-    conn = sqlite3.connect(settings.db_path)
+    with _conn_lock:
+        _create_schema(_get_conn(), settings)
+
+def _create_schema(conn: sqlite3.Connection, settings):
+    """Create tables and record the current Flox environment"""
     cursor = conn.cursor()
     
     # Create tables
@@ -28,10 +159,22 @@ def init_db():
             timestamp TEXT,
             model_used TEXT,
             response_time REAL,
-            flox_env TEXT
+            flox_env TEXT,
+            ts_ms INTEGER
         )
     ''')
     
+    # Older databases only have the ISO text timestamp; add and backfill
+    # the integer epoch-millisecond column (text was written in local time)
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(chat_messages)')}
+    if 'ts_ms' not in columns:
+        cursor.execute('ALTER TABLE chat_messages ADD COLUMN ts_ms INTEGER')
+        cursor.execute('''
+            UPDATE chat_messages
+            SET ts_ms = CAST((julianday(timestamp, 'utc') - 2440587.5) * 86400000 AS INTEGER)
+            WHERE ts_ms IS NULL AND timestamp IS NOT NULL
+        ''')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS feedback (
             id INTEGER PRIMARY KEY,
@@ -57,8 +200,18 @@ def init_db():
         )
     ''')
     
+    # Indexes for per-session history and feedback stats
+    cursor.execute('DROP INDEX IF EXISTS idx_chat_session_ts')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_session_ts_ms ON chat_messages(session_id, ts_ms DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_session ON feedback(session_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_worked ON feedback(worked)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_ts ON feedback(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_qr ON feedback(query_text, response_text)')
+    _create_feedback_fts(cursor)
+    
     # Store current Flox environment info
-    flox_info = settings.get_flox_info()
+    flox_info = settings.flox_info
+    now = datetime.now().isoformat()
     cursor.execute('''
         INSERT OR REPLACE INTO flox_environment_info 
         (id, env_name, project_dir, floxai_version, system_info, created_at, updated_at)
@@ -68,96 +221,125 @@ def init_db():
         flox_info["project_directory"], 
         flox_info["floxai_version"],
         json.dumps(flox_info["system_info"]),
-        datetime.now().isoformat(),
-        datetime.now().isoformat()
+        now,
+        now
     ))
-    
-    conn.commit()
-    conn.close()
 
-def save_chat_message(session_id: str, role: str, content: str, 
-                     model_used: Optional[str] = None, response_time: Optional[float] = None) -> int:
-    """Save a chat message with Flox environment context"""
-    settings = get_settings()
-    conn = sqlite3.connect(settings.db_path)
-    cursor = conn.cursor()
+def _create_feedback_fts(cursor: sqlite3.Cursor):
+    """Mirror feedback.query_text into an FTS5 index kept in sync by triggers"""
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'"
+    ).fetchone()
+    
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts
+            USING fts5(query_text, content='feedback', content_rowid='id')
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5; similar-query lookups fall back to LIKE
+        logger.warning("⚠️  Full-text search unavailable: %s", e)
+        return
     
     cursor.execute('''
-        INSERT INTO chat_messages (session_id, role, content, timestamp, model_used, response_time, flox_env)
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_ai AFTER INSERT ON feedback BEGIN
+            INSERT INTO feedback_fts(rowid, query_text) VALUES (new.id, new.query_text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_ad AFTER DELETE ON feedback BEGIN
+            INSERT INTO feedback_fts(feedback_fts, rowid, query_text) VALUES ('delete', old.id, old.query_text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_au AFTER UPDATE OF query_text ON feedback BEGIN
+            INSERT INTO feedback_fts(feedback_fts, rowid, query_text) VALUES ('delete', old.id, old.query_text);
+            INSERT INTO feedback_fts(rowid, query_text) VALUES (new.id, new.query_text);
+        END
+    ''')
+    
+    # Index feedback that predates the FTS table
+    if not exists:
+        cursor.execute("INSERT INTO feedback_fts(feedback_fts) VALUES ('rebuild')")
+
+async def save_chat_message(session_id: str, role: str, content: str, 
+                            model_used: Optional[str] = None, response_time: Optional[float] = None) -> int:
+    """Save a chat message with Flox environment context"""
+    future = _submit_write('''
+        INSERT INTO chat_messages (session_id, role, content, ts_ms, model_used, response_time, flox_env)
         VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (session_id, role, content, datetime.now().isoformat(), model_used, response_time, settings.flox_env_name))
+    ''', (session_id, role, content, time.time_ns() // 1_000_000, model_used, response_time, SETTINGS.flox_env_name))
     
-    message_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return message_id
+    return await asyncio.wrap_future(future)
 
-def get_chat_history(session_id: str, limit: int = 50) -> List[Dict]:
+async def get_chat_history(session_id: str, limit: int = 50) -> List[Dict]:
     """Get chat history"""
-    settings = get_settings()
-    conn = sqlite3.connect(settings.db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, role, content, timestamp, model_used, response_time, flox_env
-        FROM chat_messages 
-        WHERE session_id = ?
-        ORDER BY timestamp DESC
-        LIMIT ?
-    ''', (session_id, limit))
+    return await asyncio.to_thread(_read_chat_history, session_id, limit)
+
+def _read_chat_history(session_id: str, limit: int) -> List[Dict]:
+    with _conn_lock:
+        rows = _get_conn().execute('''
+            SELECT id, role, content, ts_ms, timestamp, model_used, response_time, flox_env
+            FROM chat_messages 
+            WHERE session_id = ?
+            ORDER BY ts_ms DESC, id DESC
+            LIMIT ?
+        ''', (session_id, limit)).fetchall()
     
     messages = []
-    for row in cursor.fetchall():
+    for row in rows:
         messages.append({
             "id": row[0],
             "role": row[1], 
             "content": row[2],
-            "timestamp": row[3],
-            "model_used": row[4],
-            "response_time": row[5],
-            "flox_env": row[6]
+            # Stored as epoch milliseconds; formatted for display on read
+            "timestamp": datetime.fromtimestamp(row[3] / 1000).isoformat() if row[3] is not None else row[4],
+            "model_used": row[5],
+            "response_time": row[6],
+            "flox_env": row[7]
         })
     
-    conn.close()
     return list(reversed(messages))
 
-def save_feedback(session_id: str, message_id: int, query_text: str, 
-                 response_text: str, worked: bool = False) -> int:
+async def save_feedback(session_id: str, message_id: int, query_text: str, 
+                        response_text: str, worked: bool = False) -> int:
     """Save feedback with Flox environment context"""
-    settings = get_settings()
-    conn = sqlite3.connect(settings.db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    future = _submit_write('''
         INSERT INTO feedback (session_id, message_id, query_text, response_text, worked, timestamp, flox_env)
         VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (session_id, message_id, query_text, response_text, worked, datetime.now().isoformat(), settings.flox_env_name))
+    ''', (session_id, message_id, query_text, response_text, worked, datetime.now().isoformat(), SETTINGS.flox_env_name))
     
-    feedback_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return feedback_id
+    return await asyncio.wrap_future(future)
 
-def get_flox_stats() -> Dict:
-    """Get Flox-specific statistics"""
-    settings = get_settings()
-    conn = sqlite3.connect(settings.db_path)
-    cursor = conn.cursor()
+async def get_flox_stats() -> Dict:
+    """Get Flox-specific statistics (cached briefly to absorb dashboard polling)"""
+    global _stats_cache
+    now = time.monotonic()
+    if _stats_cache is not None and now - _stats_cache[0] < STATS_CACHE_TTL:
+        return _stats_cache[1]
     
+    stats = await asyncio.to_thread(_read_flox_stats)
+    if "error" not in stats:
+        _stats_cache = (now, stats)
+    return stats
+
+def _read_flox_stats() -> Dict:
     try:
-        # Get environment info
-        cursor.execute('SELECT * FROM flox_environment_info WHERE id = 1')
-        env_row = cursor.fetchone()
-        
-        # Get usage stats
-        cursor.execute('SELECT COUNT(*) FROM chat_messages')
-        total_messages = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM feedback WHERE worked = 1')
-        successful_interactions = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(DISTINCT session_id) FROM chat_messages')
-        unique_sessions = cursor.fetchone()[0]
+        with _conn_lock:
+            cursor = _get_conn().cursor()
+            
+            # Get environment info
+            cursor.execute('SELECT * FROM flox_environment_info WHERE id = 1')
+            env_row = cursor.fetchone()
+            
+            # Get usage stats in a single round-trip
+            cursor.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM chat_messages),
+                    (SELECT COUNT(*) FROM feedback WHERE worked = 1),
+                    (SELECT COUNT(DISTINCT session_id) FROM chat_messages)
+            ''')
+            total_messages, successful_interactions, unique_sessions = cursor.fetchone()
         
         flox_info = {
             "environment": {
@@ -174,9 +356,7 @@ def get_flox_stats() -> Dict:
             }
         }
         
-        conn.close()
         return flox_info
         
     except Exception as e:
-        conn.close()
         return {"error": str(e)}
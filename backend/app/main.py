@@ -3,106 +3,125 @@ FloxAI Backend - Showcasing Flox's Power for Development Environments
 """
 import os
 import asyncio
+import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 from app.api import chat
-from app.db.database import init_db
+from app.db.database import init_db, close_db
 from app.services.rag_service import FloxRAGService
 from app.services.llm_service import FloxLLMService
+from app.services.learning_service import FloxLearningService
 from app.core.config import get_settings
 
+logger = logging.getLogger(__name__)
+
 # Global services
 rag_service = None
 llm_service = None
+learning_service = None
+
+def _report_init_error(service_name: str, error: BaseException):
+    """Log a service initialization failure without aborting startup"""
+    logger.warning("⚠️  %s service initialization warning: %s", service_name, error,
+                   exc_info=(type(error), error, error.__traceback__))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan management"""
-    global rag_service, llm_service
+    global rag_service, llm_service, learning_service
     
     settings = get_settings()
-    flox_info = settings.get_flox_info()
-    context_info = settings.get_context_info()
+    flox_info = settings.flox_info
+    context_info = settings.context_info
     
     mode_label = "Context-Aware Development" if context_info["mode"] == "context-aware" else "Standalone"
-    print(f"🌟 Starting FloxAI Backend - The Flox Development Co-pilot ({mode_label} Mode)")
-    print("=" * 70)
-    print(f"🔧 Flox Environment: {flox_info['environment_name']}")
-    print(f"📁 Project Directory: {flox_info['project_directory']}")
-    print(f"🏗️  Platform: {flox_info['system_info'].get('platform', 'unknown')} {flox_info['system_info'].get('architecture', 'unknown')}")
-    print(f"🚀 FloxAI Version: {flox_info['floxai_version']}")
-    print(f"🎯 Mode: {mode_label}")
+    logger.info("🌟 Starting FloxAI Backend - The Flox Development Co-pilot (%s Mode)", mode_label)
+    logger.info("=" * 70)
+    logger.info("🔧 Flox Environment: %s", flox_info['environment_name'])
+    logger.info("📁 Project Directory: %s", flox_info['project_directory'])
+    logger.info("🏗️  Platform: %s %s", flox_info['system_info'].get('platform', 'unknown'), flox_info['system_info'].get('architecture', 'unknown'))
+    logger.info("🚀 FloxAI Version: %s", flox_info['floxai_version'])
+    logger.info("🎯 Mode: %s", mode_label)
     
     if context_info["mode"] == "context-aware":
-        print(f"   📦 Project Types: {', '.join(context_info['project_types']) if context_info['project_types'] else 'None detected'}")
-        print(f"   📄 Project Files: {', '.join(context_info['project_files']) if context_info['project_files'] else 'None detected'}")
+        logger.info("   📦 Project Types: %s", ', '.join(context_info['project_types']) or 'None detected')
+        logger.info("   📄 Project Files: %s", ', '.join(context_info['project_files']) or 'None detected')
         if context_info["manifest_path"]:
-            print("   ✅ Flox manifest found - environment analysis enabled")
+            logger.info("   ✅ Flox manifest found - environment analysis enabled")
     
-    print("=" * 70)
+    logger.info("=" * 70)
     
     # Initialize database
     init_db()
-    print("📚 Database initialized with Flox environment tracking")
+    logger.info("📚 Database initialized with Flox environment tracking")
+    
+    # Initialize services concurrently; a failure in one doesn't block the other
+    rag_service = FloxRAGService()
+    llm_service = FloxLLMService()
+    rag_result, llm_result = await asyncio.gather(
+        rag_service.initialize(),
+        llm_service.initialize(),
+        return_exceptions=True
+    )
     
-    # Initialize services
-    try:
-        rag_service = FloxRAGService()
-        await rag_service.initialize()
-        print("🧠 Flox RAG service initialized - ready to help with Flox questions!")
-
-        print("🔍 Debug: About to create FloxLLMService...")
-        llm_service = FloxLLMService()
-        print("🔍 Debug: FloxLLMService created, about to initialize...")
-        await llm_service.initialize()
-        print(f"🔍 Debug: LLM initialization complete, is_ready = {llm_service.is_ready}")
-
+    if isinstance(rag_result, BaseException):
+        _report_init_error("RAG", rag_result)
+    else:
+        logger.info("🧠 Flox RAG service initialized - ready to help with Flox questions!")
+    
+    if isinstance(llm_result, BaseException):
+        _report_init_error("LLM", llm_result)
+    else:
+        logger.debug("🔍 Debug: LLM initialization complete, is_ready = %s", llm_service.is_ready)
         if llm_service.is_ready:
-            print("🤖 Claude integration ready - FloxAI co-pilot online!")
+            logger.info("🤖 Claude integration ready - FloxAI co-pilot online!")
         else:
-            print("⚠️  Claude API not configured - set CLAUDE_API_KEY for full functionality")
-
-    except Exception as e:
-        print(f"⚠️  Service initialization warning: {e}")
-        import traceback
-        traceback.print_exc()
+            logger.warning("⚠️  Claude API not configured - set CLAUDE_API_KEY for full functionality")
+    
+    learning_service = FloxLearningService()
     
     # Store services in app state
     app.state.rag_service = rag_service
     app.state.llm_service = llm_service
+    app.state.learning_service = learning_service
     
-    print("")
-    print("✅ FloxAI Backend Ready!")
-    print(f"   🌐 API Server: http://localhost:{settings.api_port}")
-    print(f"   📖 API Docs: http://localhost:{settings.api_port}/docs")
-    print(f"   ❤️  Health Check: http://localhost:{settings.api_port}/health")
-    print("")
-    print("🎯 FloxAI showcases Flox's power for reproducible development environments!")
-    print("")
+    logger.info("✅ FloxAI Backend Ready!")
+    logger.info("   🌐 API Server: http://localhost:%s", settings.api_port)
+    logger.info("   📖 API Docs: http://localhost:%s/docs", settings.api_port)
+    logger.info("   ❤️  Health Check: http://localhost:%s/health", settings.api_port)
+    logger.info("🎯 FloxAI showcases Flox's power for reproducible development environments!")
     
     yield
     
     # Cleanup
-    print("🛑 Shutting down FloxAI backend...")
+    logger.info("🛑 Shutting down FloxAI backend...")
     if rag_service:
         await rag_service.cleanup()
     if llm_service:
         await llm_service.cleanup()
-    print("👋 FloxAI backend stopped cleanly")
+    if learning_service:
+        learning_service.close()
+    close_db()
+    logger.info("👋 FloxAI backend stopped cleanly")
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application"""
     settings = get_settings()
     
+    # Startup messages go through the standard logger; uvicorn leaves the root logger alone
+    logging.basicConfig(level=settings.log_level.upper(), format="%(message)s")
+    
     app = FastAPI(
         title="FloxAI API - The Flox Development Co-pilot",
         description="Showcasing Flox's power for reproducible, cross-platform development environments", 
         version=settings.floxai_version,
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
         docs_url="/docs",
         redoc_url="/redoc"
     )
@@ -128,8 +147,8 @@ def create_app() -> FastAPI:
     @app.get("/health", tags=["System"])
     async def health_check():
         """Health check with Flox environment details"""
-        flox_info = settings.get_flox_info()
-        context_info = settings.get_context_info()
+        flox_info = settings.flox_info
+        context_info = settings.context_info
         
         return {
             "status": "healthy",
@@ -157,7 +176,7 @@ def create_app() -> FastAPI:
     @app.get("/", tags=["System"])
     async def root():
         """Root endpoint showcasing Flox integration"""
-        flox_info = settings.get_flox_info()
+        flox_info = settings.flox_info
         
         return {
             "service": "FloxAI - The Flox Development Co-pilot",
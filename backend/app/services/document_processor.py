@@ -1,49 +1,113 @@
 """
 FloxAI Document Processor - Process and chunk documents for vector storage
 """
+import asyncio
+import mmap
 import os
 import re
-import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import hashlib
+import multiprocessing
+import numpy as np
 
 from app.core.config import get_settings
-from app.services.embedding_service import FloxEmbeddingService
+from app.services.embedding_service import get_embedding_service
+
+# Metadata patterns, compiled once at import
+_RE_TITLE = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+_RE_DATE = re.compile(r'(\d{1,2})-([A-Za-z]+)-(\d{4})')
+
+# Path substring -> (doc_type, category), first match wins
+_PATH_CLASSES = (
+    ('blogs', 'blog_post', 'blog'),
+    ('flox', 'flox_docs', 'flox_docs'),
+    ('nix', 'nix_docs', 'nix_docs'),
+    ('processed', 'processed_docs', 'general'),
+)
+
+# Bump when chunking output changes. Manifest entries record it, and file
+# digests (so cached chunks) and the docs fingerprint are personalized with
+# it, so every file is re-chunked and re-ingested once.
+CHUNKER_VERSION = "md-split-v2"
+_CHUNKER_PERSON = CHUNKER_VERSION.encode('ascii')
+
+# Files above this size are hashed through mmap instead of one read()
+MMAP_HASH_THRESHOLD = 1 << 20
+
+# Files read at once (each holds a file descriptor) when hashing or chunking
+MAX_CONCURRENT_READS = 16
+
+# Below this many files, worker process startup costs more than it saves
+PARALLEL_CHUNK_MIN_FILES = 32
+
+# Chunk-only processor owned by each worker process of chunk_files_parallel
+_worker_processor: Optional["FloxDocumentProcessor"] = None
+
+def _init_chunk_worker():
+    """Prepare a worker process to chunk files: tokenizer only, no embedding model"""
+    global _worker_processor
+    _worker_processor = FloxDocumentProcessor()
+    _worker_processor.embedding_service.load_tokenizer()
+    # Every worker is already one of cpu_count processes
+    _worker_processor.embedding_service.tokenizer_threads = 1
+    _worker_processor.is_ready = True
+
+def _chunk_file_in_worker(file_path: Path) -> List[Dict]:
+    """Chunk one file inside a worker process"""
+    return _worker_processor._chunk_markdown_file(file_path)
 
 class FloxDocumentProcessor:
     """Process documents for vector storage and retrieval"""
     
     def __init__(self):
         self.settings = get_settings()
-        self.embedding_service = FloxEmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.is_ready = False
+        self._process_pool: Optional[ProcessPoolExecutor] = None
         
     async def initialize(self):
         """Initialize the document processor"""
         await self.embedding_service.initialize()
         self.is_ready = self.embedding_service.is_ready
     
-    def process_document(self, file_path: Path, content: str, doc_type: str = "general") -> List[Dict]:
-        """Process a single document into chunks with metadata"""
+    def process_document(self, file_path: Path, content: str, doc_type: str = "general") -> Tuple[List[Dict], np.ndarray]:
+        """Process a single document into chunks with metadata and their embeddings"""
+        chunk_docs = self.chunk_document(file_path, content, doc_type)
+        
+        # Embed every chunk of the document in one batched encode call
+        embeddings = self.embedding_service.generate_embeddings([doc['content'] for doc in chunk_docs])
+        
+        return chunk_docs, embeddings
+    
+    def chunk_document(self, file_path: Path, content: str, doc_type: str = "general",
+                       category: Optional[str] = None) -> List[Dict]:
+        """Split a single document into chunk dicts with metadata (no embeddings)"""
         if not self.is_ready:
             raise RuntimeError("Document processor not initialized")
         
+        # One timestamp for the document and all of its chunks
+        now_iso = datetime.now().isoformat()
+        
         # Extract metadata
-        metadata = self._extract_metadata(file_path, content, doc_type)
+        metadata = self._extract_metadata(file_path, content, doc_type, category, now_iso)
         
         # Chunk the content
-        chunks = self.embedding_service.chunk_text(content)
+        chunks = self.embedding_service.chunk_text(content, markdown=file_path.suffix.lower() == '.md')
+        
+        # Count tokens for every chunk in one batched call
+        token_counts = self.embedding_service.get_token_counts(chunks)
         
         # Create chunk documents
         chunk_docs = []
-        for i, chunk in enumerate(chunks):
+        for i, (chunk, token_count) in enumerate(zip(chunks, token_counts)):
             if not chunk.strip():
                 continue
                 
             chunk_doc = {
-                'id': self._generate_chunk_id(file_path, i),
+                'id': self._generate_chunk_id(file_path, i, chunk),
                 'content': chunk,
                 'chunk_index': i,
                 'total_chunks': len(chunks),
@@ -51,94 +115,236 @@ class FloxDocumentProcessor:
                 'source_name': file_path.name,
                 'doc_type': doc_type,
                 'metadata': metadata,
-                'created_at': datetime.now().isoformat(),
-                'token_count': self.embedding_service.get_token_count(chunk)
+                'created_at': now_iso,
+                'token_count': token_count
             }
             chunk_docs.append(chunk_doc)
         
         return chunk_docs
     
-    def process_markdown_file(self, file_path: Path) -> List[Dict]:
+    def process_markdown_file(self, file_path: Path) -> Tuple[List[Dict], np.ndarray]:
         """Process a markdown file specifically"""
+        chunk_docs = self._chunk_markdown_file(file_path)
+        return chunk_docs, self.embedding_service.generate_embeddings([doc['content'] for doc in chunk_docs])
+    
+    def _chunk_markdown_file(self, file_path: Path) -> List[Dict]:
+        """Read and chunk a markdown file, typing it by its path"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
             # Determine document type based on path
-            doc_type = self._determine_doc_type(file_path)
+            doc_type, category = self._classify_path(file_path)
             
-            return self.process_document(file_path, content, doc_type)
+            return self.chunk_document(file_path, content, doc_type, category)
             
         except Exception as e:
             print(f"❌ Error processing {file_path}: {e}")
             return []
     
-    def process_directory(self, directory_path: Path, pattern: str = "*.md") -> List[Dict]:
-        """Process all files in a directory matching the pattern"""
+    def process_directory(self, directory_path: Path, pattern: str = "*.md",
+                          batch_size: int = 128) -> Tuple[List[Dict], np.ndarray]:
+        """Process all files in a directory matching the pattern
+        
+        Files are chunked first, then every chunk across the corpus is embedded
+        in a single encode call so batches stay full across file boundaries.
+        """
+        all_chunks = self.chunk_directory(directory_path, pattern)
+        embeddings = self.embedding_service.generate_embeddings(
+            [chunk['content'] for chunk in all_chunks], batch_size=batch_size
+        )
+        return all_chunks, embeddings
+    
+    def chunk_directory(self, directory_path: Path, pattern: str = "*.md") -> List[Dict]:
+        """Chunk all files in a directory matching the pattern (no embeddings)"""
         if not directory_path.exists():
             return []
         
         all_chunks = []
         for file_path in directory_path.rglob(pattern):
             if file_path.is_file():
-                chunks = self.process_markdown_file(file_path)
-                all_chunks.extend(chunks)
+                all_chunks.extend(self._chunk_markdown_file(file_path))
         
         return all_chunks
     
-    def _extract_metadata(self, file_path: Path, content: str, doc_type: str) -> Dict:
+    async def chunk_directory_async(self, directory_path: Path, pattern: str = "*.md",
+                                    max_concurrent_reads: int = MAX_CONCURRENT_READS) -> List[Dict]:
+        """Chunk all matching files, reading and chunking them on worker threads
+        
+        At most max_concurrent_reads files are in flight at once; results keep
+        the same order as chunk_directory.
+        """
+        if not directory_path.exists():
+            return []
+        
+        file_paths = [file_path for file_path in directory_path.rglob(pattern) if file_path.is_file()]
+        return await self.chunk_files_async(file_paths, max_concurrent_reads)
+    
+    async def chunk_files_async(self, file_paths: List[Path],
+                                max_concurrent_reads: int = MAX_CONCURRENT_READS) -> List[Dict]:
+        """Chunk the given files on worker threads, keeping their order"""
+        semaphore = asyncio.Semaphore(max_concurrent_reads)
+        
+        async def chunk_file(file_path: Path) -> List[Dict]:
+            async with semaphore:
+                return await asyncio.to_thread(self._chunk_markdown_file, file_path)
+        
+        results = await asyncio.gather(*(chunk_file(file_path) for file_path in file_paths))
+        return [chunk for chunks in results for chunk in chunks]
+    
+    async def chunk_directory_parallel(self, directory_path: Path, pattern: str = "*.md") -> List[Dict]:
+        """Chunk all matching files across worker processes"""
+        if not directory_path.exists():
+            return []
+        
+        file_paths = [file_path for file_path in directory_path.rglob(pattern) if file_path.is_file()]
+        return await self.chunk_files_parallel(file_paths)
+    
+    async def chunk_files_parallel(self, file_paths: List[Path]) -> List[Dict]:
+        """Chunk the given files in a process pool, keeping their order
+        
+        Cleaning, splitting and token counting are CPU-bound and independent
+        per file. The pool is created on first use and reused until close().
+        """
+        if not self.is_ready:
+            raise RuntimeError("Document processor not initialized")
+        
+        if self._process_pool is None:
+            # spawn, not fork: this process runs DB, ChromaDB and torch threads,
+            # and a forked child would also inherit the loaded model
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chunk_worker
+            )
+        
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._process_pool, _chunk_file_in_worker, file_path)
+            for file_path in file_paths
+        ))
+        return [chunk for chunks in results for chunk in chunks]
+    
+    def close(self):
+        """Shut down the chunking process pool, if one was started"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(cancel_futures=True)
+            self._process_pool = None
+    
+    def find_changed_files(self, directory_path: Path, pattern: str,
+                           manifest: Dict[str, Dict]) -> Tuple[List[Path], Dict[str, Dict]]:
+        """Compare matching files against an ingest manifest
+        
+        Returns the files whose content differs from the manifest (or is new)
+        and the manifest describing the directory as it is now. Files whose
+        mtime and size are unchanged are not read at all; the rest are hashed
+        concurrently so a touched-but-identical file is not re-ingested.
+        """
+        if not directory_path.exists():
+            return [], {}
+        
+        current = {}
+        to_hash = []
+        for file_path in directory_path.rglob(pattern):
+            if not file_path.is_file():
+                continue
+            
+            key = str(file_path)
+            stat = file_path.stat()
+            entry = manifest.get(key)
+            if (entry and entry.get('chunker') == CHUNKER_VERSION
+                    and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size):
+                current[key] = entry
+            else:
+                to_hash.append((file_path, stat))
+        
+        # File reads and blake2b both release the GIL, so threads overlap the I/O
+        paths = [file_path for file_path, _ in to_hash]
+        if len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_READS) as executor:
+                digests = list(executor.map(self._file_digest, paths))
+        else:
+            digests = [self._file_digest(file_path) for file_path in paths]
+        
+        changed = []
+        for (file_path, stat), digest in zip(to_hash, digests):
+            key = str(file_path)
+            entry = manifest.get(key)
+            current[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                            'digest': digest, 'chunker': CHUNKER_VERSION}
+            if not entry or entry['digest'] != digest:
+                changed.append(file_path)
+        
+        return changed, current
+    
+    def directory_fingerprint(self, directory_path: Path, pattern: str = "*.md") -> str:
+        """Cheap fingerprint of matching files' paths, mtimes and sizes (no file reads)"""
+        if not directory_path.exists():
+            return ""
+        
+        digest = hashlib.blake2b(digest_size=16, person=_CHUNKER_PERSON)
+        for file_path in sorted(directory_path.rglob(pattern)):
+            stat = file_path.stat()
+            digest.update(f"{file_path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode('utf-8'))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _file_digest(file_path: Path) -> str:
+        """blake2b digest of a file's bytes, personalized with CHUNKER_VERSION"""
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > MMAP_HASH_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return hashlib.blake2b(mapped, person=_CHUNKER_PERSON).hexdigest()
+            return hashlib.blake2b(f.read(), person=_CHUNKER_PERSON).hexdigest()
+    
+    def _extract_metadata(self, file_path: Path, content: str, doc_type: str,
+                          category: Optional[str] = None, created_at: Optional[str] = None) -> Dict:
         """Extract metadata from document"""
         metadata = {
             'file_path': str(file_path),
             'file_name': file_path.name,
             'file_size': len(content),
             'doc_type': doc_type,
-            'created_at': datetime.now().isoformat()
+            'created_at': created_at or datetime.now().isoformat()
         }
         
         # Extract title from content
-        title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+        title_match = _RE_TITLE.search(content)
         if title_match:
             metadata['title'] = title_match.group(1).strip()
         
         # Extract tags/categories from path
-        if 'blogs' in str(file_path):
-            metadata['category'] = 'blog'
+        if category is None:
+            category = self._classify_path(file_path)[1]
+        metadata['category'] = category
+        if category == 'blog':
             # Extract date from filename if possible
-            date_match = re.search(r'(\d{1,2})-([A-Za-z]+)-(\d{4})', file_path.name)
+            date_match = _RE_DATE.search(file_path.name)
             if date_match:
                 metadata['publish_date'] = f"{date_match.group(1)} {date_match.group(2)} {date_match.group(3)}"
-        elif 'flox' in str(file_path):
-            metadata['category'] = 'flox_docs'
-        elif 'nix' in str(file_path):
-            metadata['category'] = 'nix_docs'
-        else:
-            metadata['category'] = 'general'
         
         # Extract word count
         metadata['word_count'] = len(content.split())
         
         return metadata
     
-    def _determine_doc_type(self, file_path: Path) -> str:
-        """Determine document type based on file path"""
+    def _classify_path(self, file_path: Path) -> Tuple[str, str]:
+        """Determine document type and category from the file path in one pass"""
         path_str = str(file_path).lower()
         
-        if 'blogs' in path_str:
-            return 'blog_post'
-        elif 'flox' in path_str:
-            return 'flox_docs'
-        elif 'nix' in path_str:
-            return 'nix_docs'
-        elif 'processed' in path_str:
-            return 'processed_docs'
-        else:
-            return 'general'
+        for marker, doc_type, category in _PATH_CLASSES:
+            if marker in path_str:
+                return doc_type, category
+        return 'general', 'general'
     
-    def _generate_chunk_id(self, file_path: Path, chunk_index: int) -> str:
-        """Generate unique ID for a chunk"""
-        # Use UUID for guaranteed uniqueness
-        return str(uuid.uuid4())
+    def _generate_chunk_id(self, file_path: Path, chunk_index: int, content: str) -> str:
+        """Generate a deterministic ID for a chunk
+        
+        The same file, position and content always map to the same ID, so
+        re-ingesting an unchanged document can skip chunks already stored.
+        """
+        content_hash = hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+        return hashlib.blake2b(f"{file_path}:{chunk_index}:{content_hash}".encode('utf-8'), digest_size=16).hexdigest()
     
     def get_document_stats(self, chunks: List[Dict]) -> Dict:
         """Get statistics about processed documents"""
@@ -0,0 +1,79 @@
+"""
+FloxAI Embedding Cache - Persistent text embeddings keyed by content hash
+"""
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Stay well under SQLite's bound-parameter limit in IN (...) lookups
+LOOKUP_BATCH_SIZE = 500
+
+class EmbeddingCache:
+    """SQLite-backed cache of embeddings so unchanged text is never re-encoded
+
+    Rows are keyed by the SHA-256 of the text plus the model identifier, and
+    vectors are stored as raw float32 bytes.
+    """
+
+    def __init__(self, db_path: Path, model: str):
+        self.model = model
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (hash, model)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """SHA-256 hex digest of a text"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def parse_vector(blob: bytes) -> np.ndarray:
+        """Decode a stored vector"""
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def lookup(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch cached vectors for the given hashes in batched SELECTs"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), LOOKUP_BATCH_SIZE):
+                batch = unique[start:start + LOOKUP_BATCH_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embedding_cache WHERE model = ? "
+                    f"AND hash IN ({','.join('?' * len(batch))})",
+                    (self.model, *batch)
+                ).fetchall()
+                for content_hash, blob in rows:
+                    found[content_hash] = self.parse_vector(blob)
+        return found
+
+    def store(self, vectors: Dict[str, np.ndarray]):
+        """Upsert vectors in one transaction"""
+        if not vectors:
+            return
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (hash, model, vector) VALUES (?, ?, ?)",
+                [(content_hash, self.model, np.asarray(vector, dtype=np.float32).tobytes())
+                 for content_hash, vector in vectors.items()]
+            )
+
+    def close(self):
+        """Close the cache connection"""
+        with self._lock:
+            self.conn.close()
@@ -1,16 +1,41 @@
 """
 FloxAI Embedding Service - Vector embeddings for semantic search
 """
+import asyncio
 import os
 import re
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import tiktoken
 
 from app.core.config import get_settings
 
+# Optional Rust-backed chunkers; fall back to the sentence-span chunker below
+try:
+    from semantic_text_splitter import MarkdownSplitter, TextSplitter
+except ImportError:
+    MarkdownSplitter = TextSplitter = None
+
+# Text cleanup patterns, compiled once at import
+_RE_WS = re.compile(r'\s+')
+_RE_HEADER = re.compile(r'#{1,6}\s+')
+_RE_BOLD = re.compile(r'\*\*(.*?)\*\*')
+_RE_ITALIC = re.compile(r'\*(.*?)\*')
+_RE_CODE = re.compile(r'`(.*?)`')
+_RE_LINK = re.compile(r'\[([^\]]+)\]\([^)]+\)')
+
+# HTML entities decoded in a single pass
+_RE_HTML_ENTITY = re.compile(r'&(nbsp|amp|lt|gt|quot);')
+_HTML_ENTITY_MAP = {'nbsp': ' ', 'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"'}
+
+# Query micro-batching: requests arriving within the wait window share one encode call
+EMBED_BATCH_MAX = 32
+EMBED_BATCH_WAIT_MS = 5
+
+# A sentence: a run of non-terminators plus its terminating punctuation (if any)
+_RE_SENTENCE = re.compile(r'[^.!?]+(?:[.!?]+|$)')
+
 class FloxEmbeddingService:
     """Service for generating and managing text embeddings"""
     
@@ -24,68 +49,198 @@ class FloxEmbeddingService:
         self.model_name = "all-MiniLM-L6-v2"  # Fast, good quality, small size
         self.max_chunk_size = 500
         self.chunk_overlap = 50
+        self._splitters: Dict[Tuple[int, bool], "TextSplitter"] = {}
+        
+        # Threads tiktoken may use per encode_batch call (1 in chunking workers)
+        self.tokenizer_threads = os.cpu_count() or 1
+        
+        # Micro-batching state, bound to the event loop that first uses it
+        self._embed_queue: Optional[asyncio.Queue] = None
+        self._embed_worker: Optional[asyncio.Task] = None
         
     async def initialize(self):
-        """Initialize the embedding model"""
+        """Initialize the embedding model (no-op once loaded)"""
+        if self.is_ready:
+            return
+        
         try:
             print("🔄 Loading embedding model...")
+            # Imported here, not at module level: chunking workers import this
+            # module for the tokenizer and must not pull in torch/transformers
+            from sentence_transformers import SentenceTransformer
             self.model = SentenceTransformer(self.model_name)
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+            self._apply_precision(self.settings.embedding_precision)
+            self.load_tokenizer()
             self.is_ready = True
             print(f"✅ Embedding model loaded: {self.model_name}")
         except Exception as e:
             print(f"❌ Failed to load embedding model: {e}")
             self.is_ready = False
     
-    def chunk_text(self, text: str, max_size: Optional[int] = None) -> List[str]:
-        """Split text into overlapping chunks for embedding"""
+    def load_tokenizer(self):
+        """Load the tiktoken encoding used for token counts (no embedding model needed)"""
+        if self.encoding is None:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+    
+    def _apply_precision(self, precision: str):
+        """Run the model in half precision on GPU or dynamic int8 on CPU
+        
+        A failed conversion leaves the model on fp32 with a warning rather
+        than taking the embedding service down.
+        """
+        precision = precision.lower()
+        if precision == "fp32":
+            return
+        if precision not in ("fp16", "int8"):
+            print(f"⚠️  Unknown embedding precision '{precision}' - using fp32")
+            return
+        
+        try:
+            import torch
+            
+            if precision == "fp16":
+                if torch.cuda.is_available():
+                    self.model.half()
+                    print("⚡ Embedding model running in fp16")
+                else:
+                    print("⚠️  fp16 embeddings need a CUDA device - staying on fp32")
+            else:
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8
+                )
+                print("⚡ Embedding model quantized to int8 (dynamic, CPU)")
+        except Exception as e:
+            print(f"⚠️  Could not switch the embedding model to {precision} ({e}) - using fp32")
+            self.model.float()
+    
+    def chunk_text(self, text: str, max_size: Optional[int] = None, markdown: bool = False) -> List[str]:
+        """Split text into overlapping chunks for embedding
+        
+        The raw text is split first, so the splitter still sees paragraph,
+        heading and code-fence boundaries; each chunk is cleaned afterwards.
+        """
         if max_size is None:
             max_size = self.max_chunk_size
-            
-        # Clean and normalize text
-        text = self._clean_text(text)
         
-        # Split by sentences first
-        sentences = re.split(r'[.!?]+', text)
+        if TextSplitter is not None:
+            chunks = self._get_splitter(max_size, markdown).chunks(text)
+        else:
+            chunks = self._chunk_by_sentences(text, max_size)
+        
+        cleaned = (self._clean_text(chunk) for chunk in chunks)
+        return [chunk for chunk in cleaned if chunk]
+    
+    def _get_splitter(self, max_size: int, markdown: bool) -> "TextSplitter":
+        """Return a cached boundary-aware splitter for the given character capacity"""
+        key = (max_size, markdown)
+        splitter = self._splitters.get(key)
+        if splitter is None:
+            splitter_class = MarkdownSplitter if markdown else TextSplitter
+            splitter = splitter_class(max_size, overlap=self.chunk_overlap)
+            self._splitters[key] = splitter
+        return splitter
+    
+    def _chunk_by_sentences(self, text: str, max_size: int) -> List[str]:
+        """Fallback chunker: split text on sentence punctuation"""
+        # Walk sentence spans and cut chunks as slices of the text,
+        # stepping back chunk_overlap characters at each boundary
         chunks = []
-        current_chunk = ""
+        chunk_start = None
+        prev_end = 0
         
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-                
-            # Check if adding this sentence would exceed max size
-            if len(current_chunk) + len(sentence) + 1 > max_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                # Start new chunk with overlap
-                overlap_text = current_chunk[-self.chunk_overlap:] if len(current_chunk) > self.chunk_overlap else ""
-                current_chunk = overlap_text + " " + sentence
-            else:
-                current_chunk += " " + sentence if current_chunk else sentence
+        for match in _RE_SENTENCE.finditer(text):
+            start, end = match.span()
+            if chunk_start is None:
+                chunk_start = start
+            elif end - chunk_start > max_size and prev_end > chunk_start:
+                chunks.append(text[chunk_start:prev_end].strip())
+                chunk_start = max(prev_end - self.chunk_overlap, chunk_start)
+            prev_end = end
         
         # Add the last chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if chunk_start is not None and text[chunk_start:prev_end].strip():
+            chunks.append(text[chunk_start:prev_end].strip())
         
         return chunks
     
-    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for a list of texts"""
+    def generate_embeddings(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Generate normalized embeddings for a list of texts in batched forward passes"""
         if not self.is_ready:
             raise RuntimeError("Embedding service not initialized")
         
         if not texts:
             return np.array([])
         
-        # Generate embeddings
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings
+        # encode() already sorts by length internally so minibatches pad evenly;
+        # the win here is feeding it many documents' chunks in one call
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            convert_to_tensor=False,
+            normalize_embeddings=True,
+            show_progress_bar=len(texts) > 100
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
     
     def generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for a single text"""
         return self.generate_embeddings([text])[0]
     
+    async def embed_async(self, text: str) -> np.ndarray:
+        """Embed one text, batched with any other requests made within a few milliseconds"""
+        if not self.is_ready:
+            raise RuntimeError("Embedding service not initialized")
+        
+        loop = asyncio.get_running_loop()
+        if self._embed_worker is None or self._embed_worker.done() or self._embed_worker.get_loop() is not loop:
+            self._embed_queue = asyncio.Queue()
+            self._embed_worker = loop.create_task(self._embed_batches(self._embed_queue))
+        
+        future = loop.create_future()
+        self._embed_queue.put_nowait((text, future))
+        return await future
+    
+    async def _embed_batches(self, queue: asyncio.Queue):
+        """Background worker: drain queued texts into batched encode calls"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + EMBED_BATCH_WAIT_MS / 1000
+            while len(batch) < EMBED_BATCH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                embeddings = await asyncio.to_thread(
+                    self.generate_embeddings, [text for text, _ in batch], EMBED_BATCH_MAX
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+    
+    async def close(self):
+        """Stop the micro-batching worker"""
+        if self._embed_worker is not None and not self._embed_worker.done():
+            self._embed_worker.cancel()
+            try:
+                await self._embed_worker
+            except asyncio.CancelledError:
+                pass
+        self._embed_worker = None
+        self._embed_queue = None
+    
     def cosine_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """Calculate cosine similarity between two embeddings"""
         # Normalize embeddings
@@ -99,27 +254,41 @@ class FloxEmbeddingService:
         similarity = np.dot(embedding1, embedding2) / (norm1 * norm2)
         return float(similarity)
     
+    @staticmethod
+    def normalize(embeddings: np.ndarray) -> np.ndarray:
+        """L2-normalize a vector or the rows of a matrix (zero rows stay zero)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1.0, norms)
+    
+    def cosine_similarity_batch(self, query: np.ndarray, embeddings: np.ndarray,
+                                normalized: bool = False) -> np.ndarray:
+        """Cosine similarity of one query (or a matrix of queries) against every row of embeddings
+        
+        Returns shape (N,) for a single query or (N, M) for M queries. Pass
+        normalized=True when the rows are already unit length, as everything
+        from generate_embeddings is, so the whole call is one matrix product.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32) if normalized else self.normalize(embeddings)
+        return matrix @ self.normalize(query).T
+    
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text for embedding"""
         if not text:
             return ""
         
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = _RE_WS.sub(' ', text)
         
         # Remove HTML entities
-        text = text.replace('&nbsp;', ' ')
-        text = text.replace('&amp;', '&')
-        text = text.replace('&lt;', '<')
-        text = text.replace('&gt;', '>')
-        text = text.replace('&quot;', '"')
+        text = _RE_HTML_ENTITY.sub(lambda m: _HTML_ENTITY_MAP[m.group(1)], text)
         
         # Remove markdown formatting
-        text = re.sub(r'#{1,6}\s+', '', text)  # Headers
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Bold
-        text = re.sub(r'\*(.*?)\*', r'\1', text)  # Italic
-        text = re.sub(r'`(.*?)`', r'\1', text)  # Code
-        text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)  # Links
+        text = _RE_HEADER.sub('', text)  # Headers
+        text = _RE_BOLD.sub(r'\1', text)  # Bold
+        text = _RE_ITALIC.sub(r'\1', text)  # Italic
+        text = _RE_CODE.sub(r'\1', text)  # Code
+        text = _RE_LINK.sub(r'\1', text)  # Links
         
         return text.strip()
     
@@ -130,6 +299,24 @@ class FloxEmbeddingService:
         
         return len(self.encoding.encode(text))
     
+    def get_token_counts(self, texts: List[str]) -> List[int]:
+        """Get token counts for many texts in one multi-threaded tiktoken call"""
+        if not self.encoding:
+            return [len(text.split()) for text in texts]  # Fallback to word count
+        
+        return [len(tokens) for tokens in self.encoding.encode_batch(texts, num_threads=self.tokenizer_threads)]
+    
     def is_text_too_long(self, text: str, max_tokens: int = 512) -> bool:
         """Check if text is too long for embedding"""
         return self.get_token_count(text) > max_tokens
+
+
+# One model per process; every service shares this instance
+_shared: Optional[FloxEmbeddingService] = None
+
+def get_embedding_service() -> FloxEmbeddingService:
+    """Get the process-wide embedding service"""
+    global _shared
+    if _shared is None:
+        _shared = FloxEmbeddingService()
+    return _shared
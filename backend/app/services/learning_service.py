@@ -1,14 +1,25 @@
 """
 FloxAI Learning Service - Continuous improvement from user feedback
 """
-import json
+import re
 import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+import orjson
+
 from app.core.config import get_settings
 
+_RE_WORD = re.compile(r'\w+')
+
+# Common words left out of FTS queries; they match nearly every stored query
+_STOPWORDS = frozenset({
+    'the', 'and', 'for', 'with', 'how', 'what', 'when', 'where', 'why', 'who',
+    'can', 'does', 'this', 'that', 'into', 'from', 'are', 'was', 'you', 'your',
+    'use', 'using', 'get', 'about', 'there', 'which', 'should', 'would', 'could'
+})
+
 class FloxLearningService:
     """Service for learning from user feedback and improving responses"""
     
@@ -17,11 +28,24 @@ class FloxLearningService:
         self.db_path = self.settings.db_path
         self.learning_data_path = Path(self.settings.docs_path) / "learning"
         self.learning_data_path.mkdir(parents=True, exist_ok=True)
+        
+        # One long-lived connection for all analytics queries
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self.conn.execute('PRAGMA mmap_size=268435456')
+        self.has_fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'"
+        ).fetchone() is not None
+    
+    def close(self):
+        """Close the analytics connection"""
+        self.conn.close()
     
     def analyze_feedback_patterns(self) -> Dict:
         """Analyze feedback patterns to identify improvement opportunities"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         # Get recent feedback (last 30 days)
         thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
@@ -53,8 +77,6 @@ class FloxLearningService:
             if p[3] >= 2 and p[4] >= 0.8  # 2+ occurrences, >=80% success
         ]
         
-        conn.close()
-        
         return {
             "problem_areas": high_frequency_low_success,
             "successful_patterns": successful_patterns,
@@ -122,32 +144,46 @@ class FloxLearningService:
         filename = f"learning_insights_{timestamp}.json"
         filepath = self.learning_data_path / filename
         
-        with open(filepath, 'w') as f:
-            json.dump(insights, f, indent=2)
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(insights, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         
         return str(filepath)
     
     def get_response_improvements(self, query: str) -> List[str]:
         """Get improvement suggestions for a specific query based on past feedback"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         # Look for similar queries and their success rates
-        cursor.execute('''
-            SELECT 
-                response_text,
-                AVG(CASE WHEN worked = 1 THEN 1.0 ELSE 0.0 END) as success_rate,
-                COUNT(*) as frequency
-            FROM feedback 
-            WHERE query_text LIKE ? OR query_text LIKE ?
-            GROUP BY response_text
-            HAVING COUNT(*) >= 2
-            ORDER BY success_rate DESC, frequency DESC
-            LIMIT 3
-        ''', (f"%{query[:20]}%", f"%{query[-20:]}%"))
+        match_query = self._fts_match_query(query) if self.has_fts else ""
+        if match_query:
+            cursor.execute('''
+                SELECT 
+                    f.response_text,
+                    AVG(CASE WHEN f.worked = 1 THEN 1.0 ELSE 0.0 END) as success_rate,
+                    COUNT(*) as frequency
+                FROM feedback_fts
+                JOIN feedback f ON f.id = feedback_fts.rowid
+                WHERE feedback_fts MATCH ?
+                GROUP BY f.response_text
+                HAVING COUNT(*) >= 2
+                ORDER BY success_rate DESC, frequency DESC
+                LIMIT 3
+            ''', (match_query,))
+        else:
+            cursor.execute('''
+                SELECT 
+                    response_text,
+                    AVG(CASE WHEN worked = 1 THEN 1.0 ELSE 0.0 END) as success_rate,
+                    COUNT(*) as frequency
+                FROM feedback 
+                WHERE query_text LIKE ? OR query_text LIKE ?
+                GROUP BY response_text
+                HAVING COUNT(*) >= 2
+                ORDER BY success_rate DESC, frequency DESC
+                LIMIT 3
+            ''', (f"%{query[:20]}%", f"%{query[-20:]}%"))
         
         improvements = cursor.fetchall()
-        conn.close()
         
         suggestions = []
         for response, success_rate, freq in improvements:
@@ -161,6 +197,13 @@ class FloxLearningService:
         
         return suggestions
     
+    @staticmethod
+    def _fts_match_query(query: str) -> str:
+        """Build an FTS5 MATCH expression that matches any of the query's non-stopwords"""
+        words = dict.fromkeys(word for word in _RE_WORD.findall(query.lower())
+                              if len(word) > 2 and word not in _STOPWORDS)
+        return " OR ".join(f'"{word}"' for word in words)
+    
     def update_knowledge_base_from_feedback(self) -> Dict:
         """Update knowledge base based on feedback patterns"""
         insights = self.generate_learning_insights()
@@ -186,8 +229,7 @@ class FloxLearningService:
     
     def get_learning_stats(self) -> Dict:
         """Get learning statistics for monitoring"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         # Get feedback stats
         cursor.execute('SELECT COUNT(*) FROM feedback')
@@ -204,8 +246,6 @@ class FloxLearningService:
         cursor.execute('SELECT COUNT(DISTINCT query_text) FROM feedback')
         unique_queries = cursor.fetchone()[0]
         
-        conn.close()
-        
         return {
             "total_feedback": total_feedback,
             "positive_feedback": positive_feedback,
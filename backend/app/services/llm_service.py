@@ -1,48 +1,20 @@
 """
 FloxAI LLM Service - Claude integration with Flox expertise
 """
-from typing import Dict, List, Optional
+import hashlib
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import anthropic
 
-from app.core.config import get_settings
+from app.core.config import SETTINGS
 
-class FloxLLMService:
-    """LLM service with deep Flox knowledge"""
-    
-    def __init__(self):
-        self.client = None
-        self.is_ready = False
-    
-    async def initialize(self):
-        """Initialize Claude client"""
-        settings = get_settings()
-        print(f"🔍 LLM Debug: claude_api_key = {'SET' if settings.claude_api_key else 'NOT SET'}")
-        if settings.claude_api_key:
-            print(f"🔍 LLM Debug: Key starts with: {settings.claude_api_key[:20]}...")
+CLAUDE_MODEL = "claude-sonnet-4-20250514"  # Latest Sonnet 4 model
 
-        if not settings.claude_api_key:
-            print("🔍 LLM Debug: No API key found, exiting initialization")
-            return
+# Marks a system block as a prompt-cache breakpoint (5 minute TTL)
+PROMPT_CACHE_CONTROL = {"type": "ephemeral"}
 
-        try:
-            self.client = anthropic.Anthropic(api_key=settings.claude_api_key)
-            self.is_ready = True
-            print("🔍 LLM Debug: Client created successfully, is_ready = True")
-        except Exception as e:
-            print(f"🔍 LLM Debug: Error creating client: {e}")
-            raise
-    
-    async def chat_with_context(self, user_message: str, context: str, 
-                               conversation_history: Optional[List[Dict]] = None) -> Dict:
-        """Chat with Claude using Flox context"""
-        if not self.is_ready:
-            return {"response": "Claude API not configured. Please set CLAUDE_API_KEY environment variable in your Flox environment."}
-        
-        settings = get_settings()
-        flox_info = settings.get_flox_info()
-        
-        # Enhanced system prompt with Flox expertise
-        system_prompt = f"""You are FloxAI, the ultimate Flox development co-pilot and expert assistant. You are running in a Flox environment and your primary mission is to help users master Flox while showcasing its incredible capabilities.
+# Flox expertise boilerplate. Must stay byte-for-byte identical between
+# requests so Anthropic can serve it from the prompt cache.
+STATIC_FLOX_SYSTEM = """You are FloxAI, the ultimate Flox development co-pilot and expert assistant. You are running in a Flox environment and your primary mission is to help users master Flox while showcasing its incredible capabilities.
 
 ABOUT FLOX:
 Flox is a revolutionary package manager and development environment tool that creates reproducible, cross-platform development environments. It solves the "works on my machine" problem by providing identical environments across macOS (Intel/ARM) and Linux systems.
@@ -55,12 +27,6 @@ KEY FLOX CONCEPTS:
 - Environment variables: Consistent configuration across environments
 - Zero-config setup: One command gets you a complete development environment
 
-CURRENT FLOX ENVIRONMENT:
-- Environment: {flox_info.get("environment_name", "unknown")}
-- Project: {flox_info.get("project_directory", "unknown")}
-- FloxAI Version: {flox_info.get("floxai_version", "1.0.0")}
-- Platform: {flox_info.get("system_info", {}).get("platform", "unknown")} {flox_info.get("system_info", {}).get("architecture", "unknown")}
-
 YOUR EXPERTISE AREAS:
 1. **Flox Environment Management**: Creating, activating, and managing Flox environments
 2. **Manifest Creation**: Writing and optimizing manifest.toml files
@@ -80,37 +46,204 @@ RESPONSE GUIDELINES:
 
 Be enthusiastic about Flox's capabilities while providing accurate, helpful guidance!"""
 
-        # Format user message with context
-        if context:
-            formatted_message = f"""Here is relevant Flox documentation and knowledge:
+# Static worked example sent after the system prompt. Part of the cached
+# prefix, so it also lifts the prefix above the minimum cacheable length.
+STATIC_FLOX_FEW_SHOT = [
+    {
+        "role": "user",
+        "content": "User Question: How do I add Python and a PostgreSQL database to my Flox environment?"
+    },
+    {
+        "role": "assistant",
+        "content": """Add both packages to the `[install]` section of your manifest (run `flox edit`):
+
+```toml
+version = 1
+
+[install]
+python3.pkg-path = "python3"
+postgresql.pkg-path = "postgresql"
+
+[vars]
+PGDATA = "$FLOX_ENV_CACHE/pgdata"
+PGPORT = "5432"
+
+[hook]
+on-activate = '''
+  if [ ! -d "$PGDATA" ]; then
+    initdb -D "$PGDATA" --no-locale --encoding=UTF8
+  fi
+'''
+
+[services.postgres]
+command = "postgres -D $PGDATA -p $PGPORT"
+```
 
-{context}
+Then:
+1. `flox activate --start-services` to enter the environment and start PostgreSQL
+2. `flox services status` to check the database is running
+3. Commit `.flox/` so everyone on your team gets the exact same setup on macOS and Linux
 
-User Question: {user_message}
+Because the packages, variables and service definition all live in `manifest.toml`, the environment is reproducible everywhere - no more "works on my machine"."""
+    },
+]
+
+# Identifies the cacheable prefix; logged at startup so a changed digest
+# (and therefore a cold prompt cache) is easy to spot across deploys.
+STATIC_PREFIX_DIGEST = hashlib.sha256(
+    "\n".join([STATIC_FLOX_SYSTEM] + [m["content"] for m in STATIC_FLOX_FEW_SHOT]).encode("utf-8")
+).hexdigest()[:16]
+
+
+# Per-process environment details; stable for the lifetime of the process,
+# so the block still sits inside the cached prefix
+ENVIRONMENT_BLOCK_TEMPLATE = """CURRENT FLOX ENVIRONMENT:
+- Environment: {environment_name}
+- Project: {project_directory}
+- FloxAI Version: {floxai_version}
+- Platform: {platform} {architecture}"""
+
+
+def build_environment_block(flox_info: Dict) -> str:
+    """Render the environment system block from settings.flox_info"""
+    system_info = flox_info.get("system_info", {})
+    return ENVIRONMENT_BLOCK_TEMPLATE.format(
+        environment_name=flox_info.get("environment_name", "unknown"),
+        project_directory=flox_info.get("project_directory", "unknown"),
+        floxai_version=flox_info.get("floxai_version", "1.0.0"),
+        platform=system_info.get("platform", "unknown"),
+        architecture=system_info.get("architecture", "unknown"),
+    )
+
+
+def build_prompt(static_prefix: str, rag_block: str, user_msg: str) -> Tuple[str, str]:
+    """Split a chat turn into the static system prefix and the dynamic user suffix.
+
+    Everything that changes per request (RAG sources, the question) goes in
+    the suffix so the provider-side prefix cache is never invalidated.
+    """
+    if rag_block:
+        user_suffix = f"""Here is relevant Flox documentation and knowledge:
+
+{rag_block}
+
+User Question: {user_msg}
 
 Please provide a comprehensive answer based on the Flox documentation above. Focus on practical, actionable advice that helps the user succeed with Flox development."""
-        else:
-            formatted_message = f"""User Question: {user_message}
+    else:
+        user_suffix = f"""User Question: {user_msg}
 
 Please provide helpful guidance about Flox development. If this question is outside your Flox expertise, let the user know and provide what general guidance you can."""
+    
+    return static_prefix, user_suffix
+
+class FloxLLMService:
+    """LLM service with deep Flox knowledge"""
+    
+    def __init__(self):
+        self.client = None
+        self.is_ready = False
+        self._environment_block = ""
+        self._system_blocks: List[Dict] = []
+        self._few_shot_messages: List[Dict] = []
+    
+    async def initialize(self):
+        """Initialize Claude client"""
+        settings = SETTINGS
         
+        # flox_info is fixed for the process, so the request prefix is built once
+        self._environment_block = build_environment_block(settings.flox_info)
+        self._system_blocks = self._make_system_blocks(STATIC_FLOX_SYSTEM)
+        self._few_shot_messages = [dict(message) for message in STATIC_FLOX_FEW_SHOT]
+        self._few_shot_messages[-1]["content"] = [{
+            "type": "text",
+            "text": STATIC_FLOX_FEW_SHOT[-1]["content"],
+            "cache_control": PROMPT_CACHE_CONTROL
+        }]
+        
+        print(f"🔍 LLM Debug: claude_api_key = {'SET' if settings.claude_api_key else 'NOT SET'}")
+        if settings.claude_api_key:
+            print(f"🔍 LLM Debug: Key starts with: {settings.claude_api_key[:20]}...")
+
+        if not settings.claude_api_key:
+            print("🔍 LLM Debug: No API key found, exiting initialization")
+            return
+
         try:
-            # Use the latest model
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",  # Latest Sonnet 4 model
-                max_tokens=2000,
-                temperature=0.1,
-                system=system_prompt,
-                messages=[{"role": "user", "content": formatted_message}]
-            )
+            self.client = anthropic.AsyncAnthropic(api_key=settings.claude_api_key)
+            self.is_ready = True
+            print("🔍 LLM Debug: Client created successfully, is_ready = True")
+            print(f"🔍 LLM Debug: Static prompt prefix digest = {STATIC_PREFIX_DIGEST}")
+        except Exception as e:
+            print(f"🔍 LLM Debug: Error creating client: {e}")
+            raise
+    
+    def _make_system_blocks(self, system_prefix: str) -> List[Dict]:
+        """Cached static prompt block followed by the environment block"""
+        return [
+            {"type": "text", "text": system_prefix, "cache_control": PROMPT_CACHE_CONTROL},
+            {"type": "text", "text": self._environment_block},
+        ]
+    
+    def _build_request(self, system_prefix: str, user_suffix: str) -> Dict:
+        """Assemble messages.create arguments: cached prefix first, dynamic suffix last"""
+        if system_prefix is STATIC_FLOX_SYSTEM:
+            system_blocks = self._system_blocks
+        else:
+            system_blocks = self._make_system_blocks(system_prefix)
+        
+        # [static system] + [static few-shot] + [dynamic RAG block + question]
+        messages = self._few_shot_messages + [{"role": "user", "content": user_suffix}]
+        
+        return {
+            "model": CLAUDE_MODEL,
+            "max_tokens": 2000,
+            "temperature": 0.1,
+            "system": system_blocks,
+            "messages": messages,
+        }
+    
+    async def chat_with_context(self, system_prefix: str, user_suffix: str,
+                               conversation_history: Optional[List[Dict]] = None) -> Dict:
+        """Chat with Claude using a cached static prefix and a dynamic suffix"""
+        if not self.is_ready:
+            return {"response": "Claude API not configured. Please set CLAUDE_API_KEY environment variable in your Flox environment."}
+        
+        try:
+            response = await self.client.messages.create(**self._build_request(system_prefix, user_suffix))
             
             return {
                 "response": response.content[0].text,
-                "model": response.model
+                "model": response.model,
+                "usage": self._usage_to_dict(response.usage)
             }
         except Exception as e:
             return {"response": f"I apologize, but I encountered an error: {str(e)}\n\nPlease check your Claude API key and try again."}
     
+    async def stream_chat_with_context(self, system_prefix: str, user_suffix: str) -> AsyncIterator[str]:
+        """Stream Claude's response text as it is generated"""
+        if not self.is_ready:
+            yield "Claude API not configured. Please set CLAUDE_API_KEY environment variable in your Flox environment."
+            return
+        
+        try:
+            async with self.client.messages.stream(**self._build_request(system_prefix, user_suffix)) as stream:
+                async for text in stream.text_stream:
+                    yield text
+        except Exception as e:
+            yield f"I apologize, but I encountered an error: {str(e)}\n\nPlease check your Claude API key and try again."
+    
+    @staticmethod
+    def _usage_to_dict(usage) -> Dict:
+        """Flatten Anthropic usage, including prompt cache counters"""
+        return {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        }
+    
     async def cleanup(self):
         """Cleanup"""
-        pass
+        if self.client is not None:
+            await self.client.close()
@@ -1,54 +1,114 @@
 """
 FloxAI RAG Service - Flox-focused document search and retrieval
 """
+import asyncio
 import os
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from app.services.vector_rag_service import FloxVectorRAGService
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.query_cache import QueryCache
+from app.services.vector_rag_service import FLOX_DOC_TYPES, FLOX_TOKEN, FloxVectorRAGService
+
+# Query words that signal a Flox-specific question
+FLOX_QUERY_KEYWORDS = ('flox', 'manifest', 'environment', 'package', 'service', 'activate')
+
+# Context appended to every query before it is embedded
+SEARCH_CONTEXT = "flox development environment package management"
+
+# Common questions searched once the documents are loaded, so their first real use is cached
+WARMUP_QUERIES = (
+    "build and publish",
+    "flox build",
+    "flox install",
+    "flox activate",
+    "manifest.toml configuration",
+    "flox services",
+)
+
+@lru_cache(maxsize=4096)
+def _has_flox_context(query: str) -> bool:
+    """Whether a query mentions any Flox keyword (cached, queries repeat often)"""
+    query_lower = query.lower()
+    return any(word in query_lower for word in FLOX_QUERY_KEYWORDS)
+
+@lru_cache(maxsize=256)
+def _query_words_pattern(query_words: Tuple[str, ...]) -> re.Pattern:
+    """Compile one alternation matching any of the query words, ignoring case"""
+    return re.compile('|'.join(map(re.escape, query_words)), re.IGNORECASE)
 
 class FloxRAGService:
     """Flox-focused document search service with vector-based semantic search"""
     
     def __init__(self):
+        settings = get_settings()
         self.vector_service = FloxVectorRAGService()
         self.is_ready = False
-        self.flox_docs = []
-        self.documents = []
+        self._query_cache = QueryCache(
+            max_size=settings.rag_query_cache_size,
+            ttl_seconds=settings.rag_query_cache_ttl
+        )
+        self._load_task: Optional[asyncio.Task] = None
     
-    async def initialize(self):
-        """Initialize the service"""
+    async def initialize(self, background: bool = True):
+        """Initialize the service
+        
+        With background=True (the default) this returns once the model and
+        vector store are up; documents are loaded and the warm-up queries run
+        on a background task. Searches in the meantime see whatever is already
+        in the vector database. Use wait_until_loaded() to block on the load.
+        """
         await self.vector_service.initialize()
-        if self.vector_service.is_ready:
-            await self.load_documents()
-            self.is_ready = True
-        else:
+        if not self.vector_service.is_ready:
             print("❌ Vector RAG service failed to initialize")
             self.is_ready = False
+            return
+        
+        self.is_ready = True
+        if background:
+            self._load_task = asyncio.create_task(self._load_and_warm_up())
+        else:
+            await self._load_and_warm_up()
+    
+    async def _load_and_warm_up(self):
+        """Load documents, then pre-populate the search caches with common queries"""
+        try:
+            await self.load_documents()
+            await self.batch_search(list(WARMUP_QUERIES))
+            print(f"🔥 Search caches warmed with {len(WARMUP_QUERIES)} common queries")
+        except Exception as e:
+            print(f"❌ Background document load failed: {e}")
+    
+    async def wait_until_loaded(self):
+        """Wait for the background document load started by initialize()"""
+        if self._load_task is not None:
+            await asyncio.shield(self._load_task)
     
     async def load_documents(self):
         """Load Flox documentation into vector database"""
-        from app.core.config import get_settings
         settings = get_settings()
         docs_path = Path(settings.docs_path)
         
-        if not docs_path.exists():
+        if docs_path.exists():
+            # Load documents into vector database
+            stats = await self.vector_service.load_documents(docs_path)
+            print(f"📚 Loaded {stats.get('chunks_processed', 0)} document chunks")
+        else:
             print("⚠️  Documentation path does not exist")
-            return
-        
-        # Load documents into vector database
-        stats = await self.vector_service.load_documents(docs_path)
-        print(f"📚 Loaded {stats.get('chunks_processed', 0)} document chunks")
         
-        # Add FloxAI-specific knowledge
-        self._add_floxai_knowledge()
+        # Add FloxAI-specific knowledge and Flox best practices in one batch,
+        # so they share a single encode pass and ChromaDB write
+        builtin_docs = self._floxai_knowledge_docs() + [self._flox_best_practices_doc()]
+        await self.vector_service.add_builtin_documents(builtin_docs)
         
-        # Add Flox best practices
-        self._add_flox_best_practices()
+        self._query_cache.invalidate()
     
-    def _add_floxai_knowledge(self):
-        """Add FloxAI-specific documentation"""
+    def _floxai_knowledge_docs(self) -> List[Dict]:
+        """FloxAI-specific documentation for the vector database"""
         floxai_docs = [
             {
                 'content': """
@@ -118,11 +178,10 @@ is-daemon = true
             }
         ]
         
-        self.flox_docs.extend(floxai_docs)
-        self.documents.extend(floxai_docs)
+        return floxai_docs
     
-    def _add_flox_best_practices(self):
-        """Add Flox best practices and common patterns"""
+    def _flox_best_practices_doc(self) -> Dict:
+        """Flox best practices and common patterns for the vector database"""
         best_practices = {
             'content': """
 # Flox Best Practices
@@ -156,56 +215,111 @@ is-daemon = true
             'type': 'best_practices'
         }
         
-        self.documents.append(best_practices)
+        return best_practices
     
     async def search(self, query: str) -> List[Dict]:
         """Enhanced search with Flox focus using vector similarity"""
         if not self.is_ready:
             return []
         
+        # Repeated queries (ignoring case and surrounding whitespace) reuse the ranking
+        cached = self._query_cache.get(query)
+        if cached is not None:
+            return [dict(result) for result in cached]
+        
         # Use vector search for semantic similarity
         results = await self.vector_service.search_with_context(
             query=query,
-            context="flox development environment package management",
+            context=SEARCH_CONTEXT,
             n_results=5
         )
         
-        # Boost Flox-related content
-        flox_keywords = ['flox', 'manifest', 'environment', 'package', 'service', 'activate']
-        has_flox_context = any(word in query.lower() for word in flox_keywords)
+        if not results:
+            return results
         
-        # Apply Flox-specific boosting
-        for result in results:
-            content_lower = result['content'].lower()
-            
-            # Boost Flox-specific documents
-            if result.get('doc_type') in ['flox_docs', 'blog_post']:
-                result['relevance_score'] *= 1.5
-            
-            # Further boost if query has Flox context
-            if has_flox_context and 'flox' in content_lower:
-                result['relevance_score'] *= 1.3
-            
-            # Ensure relevance score is between 0 and 1
-            result['relevance_score'] = min(1.0, result['relevance_score'])
+        ranked = self._rank_results(query, results)
+        self._query_cache.set(query, ranked)
+        return [dict(result) for result in ranked]
+    
+    async def batch_search(self, queries: List[str]) -> List[List[Dict]]:
+        """Search for several queries at once, in the same order as given
+        
+        Cached queries are answered directly; the rest share one batched
+        embedding pass and one ChromaDB query.
+        """
+        if not self.is_ready:
+            return [[] for _ in queries]
+        
+        ranked_lists: List[Optional[List[Dict]]] = [self._query_cache.get(query) for query in queries]
+        misses = [i for i, ranked in enumerate(ranked_lists) if ranked is None]
+        
+        if misses:
+            all_results = await self.vector_service.search_with_context_many(
+                [queries[i] for i in misses],
+                context=SEARCH_CONTEXT,
+                n_results=5
+            )
+            for i, results in zip(misses, all_results):
+                if results:
+                    ranked_lists[i] = self._rank_results(queries[i], results)
+                    self._query_cache.set(queries[i], ranked_lists[i])
+                else:
+                    ranked_lists[i] = results
+        
+        return [[dict(result) for result in ranked] for ranked in ranked_lists]
+    
+    def _rank_results(self, query: str, results: List[Dict]) -> List[Dict]:
+        """Boost Flox-related content and re-sort the results in place"""
+        has_flox_context = _has_flox_context(query)
+        
+        # Apply Flox-specific boosting to all scores at once
+        scores = np.array([result['relevance_score'] for result in results], dtype=np.float32)
+        
+        # Boost Flox-specific documents
+        is_flox_doc = np.array([result.get('doc_type') in FLOX_DOC_TYPES for result in results])
+        scores *= np.where(is_flox_doc, 1.5, 1.0)
+        
+        # Further boost if query has Flox context
+        if has_flox_context:
+            has_flox_word = np.array([self._has_flox_token(result) for result in results])
+            scores *= np.where(has_flox_word, 1.3, 1.0)
+        
+        # Ensure relevance score is between 0 and 1
+        np.minimum(scores, 1.0, out=scores)
         
-        # Sort by relevance score
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return results
+        # Sort by relevance score (stable, so ties keep retrieval order)
+        order = np.argsort(-scores, kind="stable")
+        ranked = []
+        for i in order:
+            result = results[i]
+            result['relevance_score'] = float(scores[i])
+            ranked.append(result)
+        return ranked
+    
+    def get_cache_stats(self) -> Dict:
+        """Hit/miss counters for the exact query cache and the semantic search caches"""
+        return {
+            'query_cache': self._query_cache.get_stats(),
+            'search_cache': self.vector_service.get_search_cache_stats()
+        }
+    
+    @staticmethod
+    def _has_flox_token(result: Dict) -> bool:
+        """Whether a result mentions Flox, using the flag stored at ingest when present"""
+        has_flox_token = result.get('metadata', {}).get('has_flox_token')
+        if has_flox_token is None:
+            # Chunks ingested before the flag existed
+            return FLOX_TOKEN in result['content'].lower()
+        return has_flox_token
     
     def _extract_snippet(self, content: str, query_words: List[str], max_length: int = 300) -> str:
         """Extract a relevant snippet from the content"""
-        content_lower = content.lower()
+        # Find the first occurrence of any query word in one case-insensitive scan
+        match = _query_words_pattern(tuple(query_words)).search(content) if query_words else None
         
-        # Find the first occurrence of any query word
-        best_pos = len(content)
-        for word in query_words:
-            pos = content_lower.find(word)
-            if pos != -1 and pos < best_pos:
-                best_pos = pos
-        
-        if best_pos == len(content):
+        if match is None:
             return content[:max_length] + "..." if len(content) > max_length else content
+        best_pos = match.start()
         
         # Extract snippet around the match
         start = max(0, best_pos - max_length // 2)
@@ -221,6 +335,10 @@ is-daemon = true
     
     async def get_context_for_query(self, query: str) -> Tuple[str, List[Dict]]:
         """Get formatted context with Flox expertise"""
+        if not self.is_ready:
+            return "", []
+        
+        # Repeated and near-duplicate queries are served by the search caches
         results = await self.search(query)
         
         if not results:
@@ -243,4 +361,30 @@ is-daemon = true
     
     async def cleanup(self):
         """Cleanup resources"""
-        pass
+        if self._load_task is not None and not self._load_task.done():
+            self._load_task.cancel()
+            try:
+                await self._load_task
+            except asyncio.CancelledError:
+                pass
+        await self.vector_service.embedding_service.close()
+        self.vector_service.document_processor.close()
+        self.vector_service.close()
+        
+        global _shared
+        if _shared is self:
+            _shared = None
+
+
+# One RAG service per process for scripts that would otherwise each build their own.
+# The API server doesn't use this: its service lives on app.state.
+_shared: Optional[FloxRAGService] = None
+
+async def get_shared_rag_service() -> FloxRAGService:
+    """Get the process-wide RAG service for scripts, initializing it on first use"""
+    global _shared
+    if _shared is None:
+        service = FloxRAGService()
+        await service.initialize()
+        _shared = service
+    return _shared
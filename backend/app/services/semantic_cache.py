@@ -0,0 +1,127 @@
+"""
+FloxAI Semantic Cache - Approximate query cache keyed by embeddings
+"""
+import time
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """LRU cache that matches near-duplicate queries by cosine similarity
+
+    Cached query embeddings are L2-normalized and stored as symmetric int8
+    codes with a per-row scale (a quarter of the float32 footprint), so a
+    lookup is a single integer matrix-vector product against every cached
+    query instead of a vector database search. With ttl_seconds set, entries
+    older than the TTL never match and are the first to be evicted.
+    """
+
+    def __init__(self, capacity: int = 256, threshold: float = 0.97,
+                 ttl_seconds: Optional[float] = None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._codes: Optional[np.ndarray] = None  # (capacity, dim) int8, allocated on first put
+        self._scales = np.zeros(capacity, dtype=np.float32)
+        self._values: List[Any] = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._hit_counts = np.zeros(capacity, dtype=np.int64)  # hits served by each entry
+        self._stored_at = np.zeros(capacity, dtype=np.float64)  # time.monotonic() at put
+        self._clock = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        """Return a float32 unit vector"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Symmetric int8 quantization: vector ~= codes * scale"""
+        peak = float(np.max(np.abs(vector)))
+        scale = peak / 127.0 if peak else 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return codes, scale
+
+    def _expired(self) -> Optional[np.ndarray]:
+        """Boolean mask of live slots past the TTL (None when there is no TTL)"""
+        if self.ttl_seconds is None:
+            return None
+        return time.monotonic() - self._stored_at[:self._size] > self.ttl_seconds
+
+    def _touch(self, slot: int):
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def get(self, embedding: np.ndarray) -> Optional[Any]:
+        """Return the cached value for the most similar query above the threshold"""
+        if self._size == 0:
+            self.misses += 1
+            return None
+
+        query = self._normalize(embedding)
+        if query.shape[0] != self._codes.shape[1]:
+            self.misses += 1
+            return None
+
+        query_codes, query_scale = self._quantize(query)
+        dots = self._codes[:self._size].astype(np.int32) @ query_codes.astype(np.int32)
+        similarities = dots * self._scales[:self._size] * query_scale
+        expired = self._expired()
+        if expired is not None:
+            similarities = np.where(expired, -np.inf, similarities)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        self._touch(best)
+        self._hit_counts[best] += 1
+        self.hits += 1
+        return self._values[best]
+
+    def put(self, embedding: np.ndarray, value: Any):
+        """Cache a value, evicting the least recently used entry when full"""
+        if self.capacity <= 0:
+            return
+
+        query = self._normalize(embedding)
+        if self._codes is None or self._codes.shape[1] != query.shape[0]:
+            self._codes = np.zeros((self.capacity, query.shape[0]), dtype=np.int8)
+            self._size = 0
+
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            # Reuse an expired slot first, otherwise the least recently used one
+            expired = self._expired()
+            if expired is not None and expired.any():
+                slot = int(np.argmax(expired))
+            else:
+                slot = int(np.argmin(self._last_used))
+
+        self._codes[slot], self._scales[slot] = self._quantize(query)
+        self._values[slot] = value
+        self._hit_counts[slot] = 0
+        self._stored_at[slot] = time.monotonic()
+        self._touch(slot)
+
+    def clear(self):
+        """Drop all cached entries"""
+        self._values = [None] * self.capacity
+        self._last_used[:] = 0
+        self._hit_counts[:] = 0
+        self._size = 0
+
+    def entry_hit_counts(self) -> List[int]:
+        """Hits served by each live entry, in slot order"""
+        return self._hit_counts[:self._size].tolist()
@@ -1,8 +1,14 @@
 """
 FloxAI Vector RAG Service - ChromaDB-powered semantic search
 """
+import asyncio
+import json
 import os
+import pickle
 import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import chromadb
@@ -10,15 +16,40 @@ from chromadb.config import Settings
 import numpy as np
 
 from app.core.config import get_settings
-from app.services.embedding_service import FloxEmbeddingService
-from app.services.document_processor import FloxDocumentProcessor
+from app.services.embedding_service import get_embedding_service
+from app.services.embedding_cache import EmbeddingCache
+from app.services.document_processor import PARALLEL_CHUNK_MIN_FILES, FloxDocumentProcessor
+from app.services.semantic_cache import SemanticCache
+
+# Inner-product space: every stored and query embedding is L2-normalized, so
+# Chroma's ip distance (1 - dot) equals cosine distance without the norm work
+COLLECTION_METADATA = {"description": "FloxAI document embeddings", "hnsw:space": "ip"}
+
+# Chunks mentioning this token are flagged at ingest for the Flox re-ranking boost
+FLOX_TOKEN = "flox"
+
+# Pseudo-directory that built-in knowledge documents are filed under
+BUILTIN_DOCS_ROOT = Path("builtin")
+
+# Document types search_with_context prefers, and how far it over-fetches to find them
+FLOX_DOC_TYPES = frozenset({'flox_docs', 'blog_post'})
+SEARCH_OVERFETCH = 3
+
+# Chunks sampled by get_collection_stats for the doc type / category breakdown
+STATS_SAMPLE_SIZE = 1000
+
+# Embedded slices allowed to queue up behind the ChromaDB writer thread
+MAX_PENDING_WRITES = 2
+
+# Chunks read and updated per call when backfilling new metadata fields
+BACKFILL_PAGE_SIZE = 5000
 
 class FloxVectorRAGService:
     """Vector-based RAG service using ChromaDB for semantic search"""
     
     def __init__(self):
         self.settings = get_settings()
-        self.embedding_service = FloxEmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.document_processor = FloxDocumentProcessor()
         self.client = None
         self.collection = None
@@ -28,6 +59,25 @@ class FloxVectorRAGService:
         self.collection_name = "floxai_documents"
         self.vector_db_path = Path(self.settings.vector_db_path)
         self.vector_db_path.mkdir(parents=True, exist_ok=True)
+        
+        # Records which source files (by mtime, size and hash) are in the collection
+        self.manifest_path = self.vector_db_path / "ingest_manifest.json"
+        
+        # Fingerprint of the docs tree as of the last completed ingest
+        self.fingerprint_path = self.vector_db_path / "docs.fingerprint"
+        
+        # Embeddings of every chunk text ever stored, keyed by content hash
+        self.embedding_cache = EmbeddingCache(
+            self.vector_db_path / "embedding_cache.db",
+            f"{self.embedding_service.model_name}:{self.settings.embedding_precision}"
+        )
+        
+        # Chunk lists per source file and content hash, kept across collection clears
+        self.chunk_cache_path = self.vector_db_path / "chunk_cache.pkl"
+        
+        # Search result caches matching near-duplicate query embeddings, one per
+        # n_results/doc_types filter (exact repeats are cached by FloxRAGService)
+        self._semantic_caches: Dict[Tuple, SemanticCache] = {}
     
     async def initialize(self):
         """Initialize the vector RAG service"""
@@ -53,17 +103,22 @@ class FloxVectorRAGService:
                 )
             )
             
-            # Get or create collection
-            try:
-                self.collection = self.client.get_collection(self.collection_name)
-                print(f"✅ Connected to existing collection: {self.collection_name}")
-            except Exception:
-                # Collection doesn't exist, create it
-                self.collection = self.client.create_collection(
-                    name=self.collection_name,
-                    metadata={"description": "FloxAI document embeddings"}
-                )
-                print(f"✅ Created new collection: {self.collection_name}")
+            # Get or create collection (metadata only applies when it is created)
+            self.collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata=self._collection_metadata(),
+                embedding_function=None
+            )
+            
+            # Collections built before the ingest manifest (random chunk IDs) or
+            # with other index settings can't be updated in place
+            rebuild_reason = self._rebuild_reason()
+            if rebuild_reason:
+                print(f"🔁 Rebuilding collection: {rebuild_reason}")
+                self._reset_collection()
+            else:
+                self._backfill_subdir()
+            print(f"✅ Using collection: {self.collection_name} ({self.collection.count()} chunks)")
             
             self.is_ready = True
             print("✅ Vector RAG Service initialized successfully")
@@ -72,6 +127,82 @@ class FloxVectorRAGService:
             print(f"❌ Failed to initialize Vector RAG Service: {e}")
             self.is_ready = False
     
+    def _collection_metadata(self) -> Dict:
+        """Collection metadata with the configured HNSW graph parameters"""
+        return {
+            **COLLECTION_METADATA,
+            "hnsw:M": self.settings.chroma_hnsw_m,
+            "hnsw:construction_ef": self.settings.chroma_hnsw_construction_ef,
+            "hnsw:search_ef": self.settings.chroma_hnsw_search_ef,
+        }
+    
+    def _rebuild_reason(self) -> str:
+        """Why the existing collection must be rebuilt ('' when it can be reused)"""
+        metadata = self.collection.metadata or {}
+        for key, value in self._collection_metadata().items():
+            if key.startswith("hnsw:") and metadata.get(key) != value:
+                return f"{key} is {metadata.get(key)!r}, configured {value!r}"
+        
+        if self.collection.count() and not self.manifest_path.exists():
+            return "it predates the ingest manifest"
+        return ""
+    
+    def _backfill_subdir(self):
+        """Add the 'subdir' field to chunks stored before it existed
+        
+        Unchanged files are never re-ingested, so without this their chunks
+        would stay invisible to get_docs_by_subdir. update() merges metadata,
+        so only the new field is written.
+        """
+        ids, metadatas = [], []
+        for offset in range(0, self.collection.count(), BACKFILL_PAGE_SIZE):
+            page = self.collection.get(include=["metadatas"], limit=BACKFILL_PAGE_SIZE, offset=offset)
+            for chunk_id, metadata in zip(page['ids'], page['metadatas'] or []):
+                if 'subdir' not in metadata:
+                    ids.append(chunk_id)
+                    metadatas.append({'subdir': Path(metadata.get('source_file', '')).parent.name})
+        
+        for start in range(0, len(ids), BACKFILL_PAGE_SIZE):
+            self.collection.update(
+                ids=ids[start:start + BACKFILL_PAGE_SIZE],
+                metadatas=metadatas[start:start + BACKFILL_PAGE_SIZE]
+            )
+        if ids:
+            print(f"🏷️  Tagged {len(ids)} existing chunks with their source subdirectory")
+    
+    def _reset_collection(self):
+        """Drop the collection and everything recorded about its contents"""
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata=self._collection_metadata(),
+            embedding_function=None
+        )
+        self.manifest_path.unlink(missing_ok=True)
+        self.fingerprint_path.unlink(missing_ok=True)
+        self.clear_search_cache()
+    
+    def _apply_sqlite_pragmas(self):
+        """Relax durability on Chroma's SQLite connection for faster bulk ingest
+        
+        Reaches into Chroma's private system DB, so any failure just leaves the
+        defaults in place. The pool hands out one connection per thread, so
+        this runs on the ingest writer thread (journal_mode=WAL is persisted in
+        the database file itself).
+        """
+        try:
+            pool = self.client._server._sysdb._conn_pool
+            conn = pool.connect()
+            try:
+                cursor = conn.cursor()
+                for pragma in ("journal_mode=WAL", "synchronous=OFF", "temp_store=MEMORY"):
+                    cursor.execute(f"PRAGMA {pragma}")
+            finally:
+                pool.return_to_pool(conn)
+            print("⚡ ChromaDB SQLite tuned for bulk ingest (WAL, synchronous=OFF)")
+        except Exception as e:
+            print(f"⚠️  Could not tune ChromaDB SQLite pragmas: {e}")
+    
     async def load_documents(self, docs_path: Optional[Path] = None) -> Dict:
         """Load and process documents into the vector database"""
         if not self.is_ready:
@@ -82,62 +213,270 @@ class FloxVectorRAGService:
         
         print(f"📚 Loading documents from: {docs_path}")
         
-        # Process all markdown files
-        chunks = self.document_processor.process_directory(docs_path, "*.md")
+        # Warm start: nothing in the docs tree moved since the last ingest
+        count = self.collection.count()
+        fingerprint = await asyncio.to_thread(self.document_processor.directory_fingerprint, docs_path, "*.md")
+        if count and fingerprint and fingerprint == self._read_fingerprint():
+            print("⚡ Vector DB warm, skipping reprocess")
+            return {"status": "warm", "chunks_processed": 0, "total_chunks": count}
         
-        if not chunks:
+        # Only files that changed since the last ingest are re-chunked; an
+        # empty collection means the manifest no longer describes anything
+        manifest = self._load_manifest() if count else {}
+        changed_files, current_manifest = await asyncio.to_thread(
+            self.document_processor.find_changed_files, docs_path, "*.md", manifest
+        )
+        
+        if not current_manifest:
             print("⚠️  No documents found to process")
             return {"status": "no_documents", "chunks_processed": 0}
         
-        print(f"📄 Processed {len(chunks)} chunks from documents")
+        # Drop chunks of files that were edited or deleted since the last ingest
+        stale_files = [str(path) for path in changed_files if str(path) in manifest]
+        stale_files += [path for path in manifest if path not in current_manifest]
+        if stale_files:
+            self.collection.delete(where={"source_file": {"$in": stale_files}})
+            self.clear_search_cache()
+            print(f"🧹 Removed chunks for {len(stale_files)} changed or deleted files")
+        
+        if not changed_files:
+            self._save_manifest(current_manifest)
+            self._write_fingerprint(fingerprint)
+            print("⏭️  All documents unchanged since the last ingest")
+            return {"status": "up_to_date", "chunks_processed": 0}
+        
+        # Chunk the changed markdown files (or reuse their cached chunks)
+        chunks = await self._chunk_files_cached(changed_files, current_manifest)
         
-        # Generate embeddings for all chunks
-        print("🔄 Generating embeddings...")
-        texts = [chunk['content'] for chunk in chunks]
-        embeddings = self.embedding_service.generate_embeddings(texts)
+        # Chunk IDs are content-derived, so anything already stored is unchanged
+        existing_ids = set(self.collection.get(ids=[chunk['id'] for chunk in chunks], include=[])['ids'])
+        if existing_ids:
+            chunks = [chunk for chunk in chunks if chunk['id'] not in existing_ids]
+            print(f"⏭️  Skipping {len(existing_ids)} chunks already in the vector database")
+        
+        if not chunks:
+            self._save_manifest(current_manifest)
+            self._write_fingerprint(fingerprint)
+            return {"status": "up_to_date", "chunks_processed": 0}
         
+        print(f"📄 Processed {len(chunks)} new chunks from documents")
+        
+        await self._store_chunks(chunks)
+        self._save_manifest(current_manifest)
+        self._write_fingerprint(fingerprint)
+        
+        # Get statistics
+        stats = self.document_processor.get_document_stats(chunks)
+        stats['status'] = 'success'
+        stats['chunks_processed'] = len(chunks)
+        
+        print(f"✅ Successfully loaded {len(chunks)} chunks into vector database")
+        print(f"   📊 Documents: {stats['total_documents']}")
+        print(f"   📊 Document types: {stats['doc_types']}")
+        
+        return stats
+    
+    async def _store_chunks(self, chunks: List[Dict]):
+        """Embed chunks and add them to ChromaDB with their metadata"""
         # Prepare data for ChromaDB
         ids = [chunk['id'] for chunk in chunks]
+        documents = [chunk['content'] for chunk in chunks]
         metadatas = []
-        documents = []
         
         for chunk in chunks:
+            content_lower = chunk['content'].lower()
+            flox_token_count = content_lower.count(FLOX_TOKEN)
             metadata = {
                 'source_file': chunk['source_file'],
                 'source_name': chunk['source_name'],
+                'source_name_lower': chunk['source_name'].lower(),
+                'subdir': Path(chunk['source_file']).parent.name,
                 'doc_type': chunk['doc_type'],
                 'chunk_index': chunk['chunk_index'],
                 'total_chunks': chunk['total_chunks'],
                 'category': chunk['metadata'].get('category', 'general'),
                 'title': chunk['metadata'].get('title', ''),
                 'created_at': chunk['created_at'],
-                'token_count': chunk['token_count']
+                'token_count': chunk['token_count'],
+                'has_flox_token': flox_token_count > 0,
+                'flox_token_count': flox_token_count
             }
             metadatas.append(metadata)
-            documents.append(chunk['content'])
-        
-        # Add to ChromaDB
-        print("💾 Storing in ChromaDB...")
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings.tolist(),
-            metadatas=metadatas,
-            documents=documents
-        )
         
-        # Get statistics
-        stats = self.document_processor.get_document_stats(chunks)
-        stats['status'] = 'success'
-        stats['chunks_processed'] = len(chunks)
+        # Embed and store slice by slice: a single writer thread adds one slice
+        # to ChromaDB while the next slice is being embedded. Each add is its
+        # own modest transaction and gets a float32 view, not a Python list.
+        batch_size = self.settings.chroma_add_batch_size
+        print(f"🔄 Embedding and storing in ChromaDB ({batch_size} chunks per batch)...")
+        loop = asyncio.get_running_loop()
+        pending_writes = asyncio.Semaphore(MAX_PENDING_WRITES)
         
-        print(f"✅ Successfully loaded {len(chunks)} chunks into vector database")
-        print(f"   📊 Documents: {stats['total_documents']}")
-        print(f"   📊 Document types: {stats['doc_types']}")
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer") as writer:
+            if self.settings.chroma_fast_pragmas:
+                await loop.run_in_executor(writer, self._apply_sqlite_pragmas)
+            
+            async def store(start: int, embeddings: np.ndarray):
+                end = start + batch_size
+                try:
+                    await loop.run_in_executor(writer, partial(
+                        self.collection.add,
+                        ids=ids[start:end],
+                        embeddings=embeddings,
+                        metadatas=metadatas[start:end],
+                        documents=documents[start:end]
+                    ))
+                finally:
+                    pending_writes.release()
+            
+            writes = []
+            for start in range(0, len(ids), batch_size):
+                await pending_writes.acquire()
+                embeddings = await asyncio.to_thread(
+                    self._embed_with_cache, documents[start:start + batch_size]
+                )
+                writes.append(asyncio.create_task(store(start, embeddings)))
+            
+            await asyncio.gather(*writes)
         
-        return stats
+        self.clear_search_cache()
     
-    async def search(self, query: str, n_results: int = 5, doc_types: Optional[List[str]] = None) -> List[Dict]:
-        """Search for relevant documents using semantic similarity"""
+    def _embed_with_cache(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, encoding only those not already in the embedding cache"""
+        hashes = [EmbeddingCache.content_hash(text) for text in texts]
+        cached = self.embedding_cache.lookup(hashes)
+        
+        missing = [i for i, content_hash in enumerate(hashes) if content_hash not in cached]
+        if missing:
+            fresh = self.embedding_service.generate_embeddings([texts[i] for i in missing], 128)
+            new_vectors = {hashes[i]: vector for i, vector in zip(missing, fresh)}
+            self.embedding_cache.store(new_vectors)
+            cached.update(new_vectors)
+        
+        return np.stack([cached[content_hash] for content_hash in hashes]).astype(np.float32, copy=False)
+    
+    def close(self):
+        """Release the embedding cache connection"""
+        self.embedding_cache.close()
+    
+    async def add_builtin_documents(self, documents: List[Dict]) -> int:
+        """Ingest built-in knowledge documents so they take part in retrieval
+        
+        Each document is a dict with 'content', 'source' and 'type'. Chunk IDs
+        are deterministic, so unchanged documents are skipped and edited ones
+        have their old chunks replaced. Returns the number of chunks added.
+        """
+        if not self.is_ready:
+            raise RuntimeError("Vector RAG service not initialized")
+        
+        chunks = []
+        for doc in documents:
+            chunks.extend(self.document_processor.chunk_document(
+                BUILTIN_DOCS_ROOT / doc['source'], doc['content'].strip(), doc['type'], category='floxai'
+            ))
+        
+        source_files = list({chunk['source_file'] for chunk in chunks})
+        if not source_files:
+            return 0
+        
+        existing_ids = set(self.collection.get(where={"source_file": {"$in": source_files}}, include=[])['ids'])
+        new_ids = {chunk['id'] for chunk in chunks}
+        
+        outdated_ids = list(existing_ids - new_ids)
+        if outdated_ids:
+            self.collection.delete(ids=outdated_ids)
+            self.clear_search_cache()
+        
+        chunks = [chunk for chunk in chunks if chunk['id'] not in existing_ids]
+        if chunks:
+            # Mark the collection as manifest-tracked even when no docs tree
+            # was ingested, so the next start doesn't take it for a legacy one
+            if not self.manifest_path.exists():
+                self._save_manifest({})
+            await self._store_chunks(chunks)
+            print(f"📘 Added {len(chunks)} built-in knowledge chunks")
+        
+        return len(chunks)
+    
+    async def _chunk_files_cached(self, file_paths: List[Path], manifest: Dict[str, Dict]) -> List[Dict]:
+        """Chunk files, reusing cached chunks for files whose content hash is unchanged
+        
+        The cache survives clear_collection, so rebuilding the collection from
+        an unchanged docs tree re-embeds but does not re-read or re-chunk.
+        """
+        cache = await asyncio.to_thread(self._load_chunk_cache)
+        
+        # Keep only entries that still describe a file as it is now
+        cache = {path: entry for path, entry in cache.items()
+                 if path in manifest and entry['digest'] == manifest[path]['digest']}
+        
+        to_chunk = [path for path in file_paths if str(path) not in cache]
+        if len(to_chunk) < len(file_paths):
+            print(f"⚡ Reusing cached chunks for {len(file_paths) - len(to_chunk)} unchanged files")
+        
+        # Large batches are chunked across processes, small ones on threads
+        if len(to_chunk) >= PARALLEL_CHUNK_MIN_FILES:
+            fresh_chunks = await self.document_processor.chunk_files_parallel(to_chunk)
+        else:
+            fresh_chunks = await self.document_processor.chunk_files_async(to_chunk)
+        
+        for chunk in fresh_chunks:
+            entry = cache.setdefault(chunk['source_file'], {
+                'digest': manifest[chunk['source_file']]['digest'],
+                'chunks': []
+            })
+            entry['chunks'].append(chunk)
+        
+        if to_chunk:
+            await asyncio.to_thread(self._save_chunk_cache, cache)
+        
+        return [chunk for path in file_paths for chunk in cache.get(str(path), {}).get('chunks', [])]
+    
+    def _load_chunk_cache(self) -> Dict[str, Dict]:
+        """Read the chunk cache, treating a missing or unreadable file as empty"""
+        try:
+            with open(self.chunk_cache_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return {}
+    
+    def _save_chunk_cache(self, cache: Dict[str, Dict]):
+        """Persist the chunk cache next to the vector database"""
+        with open(self.chunk_cache_path, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def _read_fingerprint(self) -> str:
+        """Read the stored docs fingerprint ('' when there is none)"""
+        try:
+            return self.fingerprint_path.read_text(encoding='utf-8').strip()
+        except OSError:
+            return ""
+    
+    def _write_fingerprint(self, fingerprint: str):
+        """Record the docs fingerprint of a completed ingest"""
+        self.fingerprint_path.write_text(fingerprint, encoding='utf-8')
+    
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Read the ingest manifest, treating a missing or corrupt file as empty"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_manifest(self, manifest: Dict[str, Dict]):
+        """Persist the ingest manifest next to the vector database"""
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+    
+    async def search(self, query: str, n_results: int = 5, doc_types: Optional[List[str]] = None,
+                     cache_query: Optional[str] = None) -> List[Dict]:
+        """Search for relevant documents using semantic similarity
+        
+        Repeated and near-duplicate queries are answered from the semantic
+        cache without touching ChromaDB. The semantic cache matches on the
+        embedding of cache_query (default: query), so callers that decorate
+        the search text can key it on what the user actually asked.
+        """
         if not self.is_ready:
             return []
         
@@ -145,50 +484,124 @@ class FloxVectorRAGService:
             return []
         
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_service.generate_embedding(query)
+            filter_key = (n_results, tuple(doc_types) if doc_types else ())
             
-            # Prepare where clause for filtering
-            where_clause = {}
-            if doc_types:
-                where_clause['doc_type'] = {"$in": doc_types}
+            # Generate query embedding (micro-batched with concurrent searches);
+            # a distinct cache key is embedded in the same batch
+            if cache_query is None or cache_query == query:
+                query_embedding = key_embedding = await self.embedding_service.embed_async(query)
+            else:
+                query_embedding, key_embedding = await asyncio.gather(
+                    self.embedding_service.embed_async(query),
+                    self.embedding_service.embed_async(cache_query)
+                )
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=n_results,
-                where=where_clause if where_clause else None
-            )
+            semantic_cache = self._semantic_caches.get(filter_key)
+            if semantic_cache is None:
+                semantic_cache = SemanticCache(
+                    capacity=self.settings.rag_cache_size,
+                    threshold=self.settings.rag_cache_threshold,
+                    ttl_seconds=self.settings.rag_query_cache_ttl
+                )
+                self._semantic_caches[filter_key] = semantic_cache
             
-            # Process results
-            search_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, (doc, metadata, distance) in enumerate(zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )):
-                    # Convert distance to similarity score (ChromaDB uses cosine distance)
-                    similarity_score = 1 - distance
-                    
-                    search_results.append({
-                        'content': doc,
-                        'source': metadata.get('source_name', 'Unknown'),
-                        'relevance_score': similarity_score,
-                        'doc_type': metadata.get('doc_type', 'general'),
-                        'category': metadata.get('category', 'general'),
-                        'title': metadata.get('title', ''),
-                        'chunk_index': metadata.get('chunk_index', 0),
-                        'total_chunks': metadata.get('total_chunks', 1),
-                        'metadata': metadata
-                    })
+            results = semantic_cache.get(key_embedding)
+            if results is None:
+                results = self._query_collection(query_embedding, n_results, doc_types)
+                semantic_cache.put(key_embedding, results)
             
-            return search_results
+            return self._copy_results(results)
             
         except Exception as e:
             print(f"❌ Search error: {e}")
             return []
     
+    async def search_many(self, queries: List[str], n_results: int = 5,
+                          doc_types: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Search for several queries with one batched embedding and one ChromaDB query
+        
+        Returns one result list per query, in the same order. Bypasses the
+        search caches, which are meant for interactive single queries.
+        """
+        if not self.is_ready or not queries:
+            return [[] for _ in queries]
+        
+        try:
+            query_embeddings = await asyncio.to_thread(
+                self.embedding_service.generate_embeddings, queries, len(queries)
+            )
+            return self._query_collection_many(query_embeddings, n_results, doc_types)
+        except Exception as e:
+            print(f"❌ Search error: {e}")
+            return [[] for _ in queries]
+    
+    def _query_collection(self, query_embedding: np.ndarray, n_results: int,
+                          doc_types: Optional[List[str]] = None) -> List[Dict]:
+        """Run a nearest-neighbour query against ChromaDB"""
+        return self._query_collection_many(query_embedding[np.newaxis, :], n_results, doc_types)[0]
+    
+    def _query_collection_many(self, query_embeddings: np.ndarray, n_results: int,
+                               doc_types: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Run one multi-query nearest-neighbour search against ChromaDB"""
+        # Prepare where clause for filtering
+        where_clause = {}
+        if doc_types:
+            where_clause['doc_type'] = {"$in": doc_types}
+        
+        # Search in ChromaDB
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where_clause if where_clause else None
+        )
+        
+        # Process results, one list per query
+        all_results = []
+        for documents, metadatas, distances in zip(
+            results['documents'] or [],
+            results['metadatas'] or [],
+            results['distances'] or []
+        ):
+            search_results = []
+            for doc, metadata, distance in zip(documents, metadatas, distances):
+                # Convert distance to similarity score: embeddings are unit length,
+                # so ip distance is 1 - cosine similarity (same as cosine space)
+                similarity_score = 1 - distance
+                
+                search_results.append({
+                    'content': doc,
+                    'source': metadata.get('source_name', 'Unknown'),
+                    'relevance_score': similarity_score,
+                    'doc_type': metadata.get('doc_type', 'general'),
+                    'category': metadata.get('category', 'general'),
+                    'title': metadata.get('title', ''),
+                    'chunk_index': metadata.get('chunk_index', 0),
+                    'total_chunks': metadata.get('total_chunks', 1),
+                    'metadata': metadata
+                })
+            all_results.append(search_results)
+        
+        # Chroma returns nothing at all for an empty collection
+        all_results += [[] for _ in range(len(query_embeddings) - len(all_results))]
+        return all_results
+    
+    @staticmethod
+    def _copy_results(results: List[Dict]) -> List[Dict]:
+        """Shallow-copy cached results so callers can re-score them freely"""
+        return [dict(result) for result in results]
+    
+    def clear_search_cache(self):
+        """Drop cached search results (the collection changed)"""
+        self._semantic_caches.clear()
+    
+    def get_search_cache_stats(self) -> Dict:
+        """Hit/miss counters for the semantic search caches"""
+        return {
+            'semantic_entries': sum(len(cache) for cache in self._semantic_caches.values()),
+            'semantic_hits': sum(cache.hits for cache in self._semantic_caches.values()),
+            'semantic_misses': sum(cache.misses for cache in self._semantic_caches.values())
+        }
+    
     async def search_with_context(self, query: str, context: str = "", n_results: int = 5) -> List[Dict]:
         """Search with additional context for better results"""
         if not self.is_ready:
@@ -197,28 +610,67 @@ class FloxVectorRAGService:
         # Combine query with context
         enhanced_query = f"{query} {context}".strip()
         
-        # Search for Flox-related content first
-        flox_results = await self.search(enhanced_query, n_results, ['flox_docs', 'blog_post'])
-        
-        # If we have enough Flox results, return them
-        if len(flox_results) >= n_results:
-            return flox_results
-        
-        # Otherwise, search more broadly
-        general_results = await self.search(enhanced_query, n_results - len(flox_results))
+        # One embedding and one over-fetched query; Flox content is then
+        # preferred client-side instead of with a second filtered query
+        # The semantic cache is keyed on the bare query: the shared context
+        # suffix would pull different short questions above its threshold
+        candidates = await self.search(enhanced_query, n_results * SEARCH_OVERFETCH, cache_query=query)
+        return self._prefer_flox_results(candidates, n_results)
+    
+    async def search_with_context_many(self, queries: List[str], context: str = "",
+                                       n_results: int = 5) -> List[List[Dict]]:
+        """search_with_context for several queries with one batched search"""
+        if not self.is_ready:
+            return [[] for _ in queries]
         
-        # Combine and deduplicate
-        all_results = flox_results + general_results
+        enhanced_queries = [f"{query} {context}".strip() for query in queries]
+        all_candidates = await self.search_many(enhanced_queries, n_results * SEARCH_OVERFETCH)
+        return [self._prefer_flox_results(candidates, n_results) for candidates in all_candidates]
+    
+    @staticmethod
+    def _prefer_flox_results(candidates: List[Dict], n_results: int) -> List[Dict]:
+        """Deduplicate candidates and put Flox results ahead of general ones"""
+        # Partition and deduplicate in a single pass
+        flox_results = []
+        general_results = []
         seen_sources = set()
-        unique_results = []
         
-        for result in all_results:
+        for result in candidates:
             source_key = f"{result['source']}_{result.get('chunk_index', 0)}"
-            if source_key not in seen_sources:
-                seen_sources.add(source_key)
-                unique_results.append(result)
+            if source_key in seen_sources:
+                continue
+            seen_sources.add(source_key)
+            if result['doc_type'] in FLOX_DOC_TYPES:
+                flox_results.append(result)
+            else:
+                general_results.append(result)
+        
+        # Flox results first, topped up with general ones
+        return (flox_results + general_results)[:n_results]
+    
+    async def get_docs_by_subdir(self, subdir: str) -> List[Dict]:
+        """Chunks whose source file sits directly in a directory of this name (e.g. 'blogs')
         
-        return unique_results[:n_results]
+        Answered by ChromaDB's metadata index rather than a scan of every
+        chunk; returns metadata only, not content or embeddings.
+        """
+        if not self.is_ready:
+            return []
+        
+        results = await asyncio.to_thread(
+            self.collection.get, where={"subdir": subdir}, include=["metadatas"]
+        )
+        return [
+            {
+                'id': chunk_id,
+                'source': metadata.get('source_name', ''),
+                'path': metadata.get('source_file', ''),
+                'doc_type': metadata.get('doc_type', 'unknown'),
+                'title': metadata.get('title', ''),
+                'chunk_index': metadata.get('chunk_index', 0)
+            }
+            for chunk_id, metadata in zip(results['ids'], results['metadatas'] or [])
+        ]
     
     async def get_collection_stats(self) -> Dict:
         """Get statistics about the vector collection"""
@@ -228,22 +680,15 @@ class FloxVectorRAGService:
         try:
             count = self.collection.count()
             
-            # Get sample metadata to analyze document types
-            sample_results = self.collection.get(limit=100)
-            doc_types = {}
-            categories = {}
-            
-            if sample_results['metadatas']:
-                for metadata in sample_results['metadatas']:
-                    doc_type = metadata.get('doc_type', 'unknown')
-                    category = metadata.get('category', 'unknown')
-                    doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
-                    categories[category] = categories.get(category, 0) + 1
+            # Sample metadata only (no documents or embeddings) to tally types
+            metadatas = self.collection.get(limit=STATS_SAMPLE_SIZE, include=["metadatas"])['metadatas'] or []
+            doc_types = Counter(metadata.get('doc_type', 'unknown') for metadata in metadatas)
+            categories = Counter(metadata.get('category', 'unknown') for metadata in metadatas)
             
             return {
                 'total_chunks': count,
-                'doc_types': doc_types,
-                'categories': categories,
+                'doc_types': dict(doc_types),
+                'categories': dict(categories),
                 'collection_name': self.collection_name
             }
             
@@ -256,11 +701,7 @@ class FloxVectorRAGService:
             return False
         
         try:
-            self.client.delete_collection(self.collection_name)
-            self.collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "FloxAI document embeddings"}
-            )
+            self._reset_collection()
             print("✅ Collection cleared successfully")
             return True
         except Exception as e:
@@ -0,0 +1,43 @@
+"""
+Tests for the batched database writer
+"""
+import asyncio
+
+import pytest
+
+from app.db import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    database.close_db()
+    monkeypatch.setattr(database.SETTINGS, "db_path", str(tmp_path / "floxai.db"))
+    database.init_db()
+    yield database
+    database.close_db()
+
+
+def test_bad_row_does_not_stall_its_batch(db):
+    async def save_both():
+        # Queued together, so both land in one writer batch
+        return await asyncio.gather(
+            db.save_feedback("s1", 2 ** 70, "query", "response"),
+            db.save_chat_message("s1", "user", "hello"),
+            return_exceptions=True
+        )
+
+    bad, good = asyncio.run(asyncio.wait_for(save_both(), timeout=5))
+
+    assert isinstance(bad, OverflowError)
+    assert isinstance(good, int)
+    assert [m["content"] for m in asyncio.run(db.get_chat_history("s1"))] == ["hello"]
+
+
+def test_writer_survives_a_bad_batch(db):
+    with pytest.raises(OverflowError):
+        asyncio.run(asyncio.wait_for(db.save_feedback("s1", 2 ** 70, "query", "response"), timeout=5))
+
+    row_id = asyncio.run(asyncio.wait_for(db.save_chat_message("s1", "user", "after"), timeout=5))
+
+    assert isinstance(row_id, int)
+    assert db._writer_thread.is_alive()
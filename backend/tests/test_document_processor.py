@@ -0,0 +1,20 @@
+"""
+Tests for the document processor's chunking workers
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_chunking_import_skips_model_stack():
+    # Spawned chunking workers import document_processor; they only need the tokenizer
+    code = (
+        "import sys, app.services.document_processor; "
+        "print(sorted(m for m in ('sentence_transformers', 'torch', 'transformers') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
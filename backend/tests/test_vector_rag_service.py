@@ -0,0 +1,67 @@
+"""
+Tests for the vector RAG service's search caches
+"""
+import asyncio
+import zlib
+from typing import List
+
+import numpy as np
+import pytest
+
+from app.services import vector_rag_service
+from app.services.rag_service import SEARCH_CONTEXT
+
+
+class BagOfWordsEmbedder:
+    """Deterministic stand-in for the model: shared words mean similar vectors"""
+
+    model_name = "bag-of-words"
+
+    def __init__(self):
+        self.texts: List[str] = []
+
+    async def embed_async(self, text: str) -> np.ndarray:
+        self.texts.append(text)
+        vector = np.zeros(256, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % 256] += 1
+        return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    settings = vector_rag_service.get_settings()
+    monkeypatch.setattr(settings, "vector_db_path", str(tmp_path))
+    # With bag-of-words vectors the context suffix alone puts two one-word
+    # questions at cosine 5/6, so a lower threshold stands in for the model's 0.97
+    monkeypatch.setattr(settings, "rag_cache_threshold", 0.8)
+
+    svc = vector_rag_service.FloxVectorRAGService()
+    svc.embedding_service = BagOfWordsEmbedder()
+    svc.is_ready = True
+
+    queried = []
+    def query_collection(query_embedding, n_results, doc_types=None):
+        queried.append(query_embedding)
+        return [{'content': f"result {len(queried)}", 'source': f"doc{len(queried)}.md", 'doc_type': 'flox_docs'}]
+
+    svc._query_collection = query_collection
+    svc.queried = queried
+    yield svc
+    svc.close()
+
+
+def test_different_short_questions_do_not_share_cached_results(service):
+    first = asyncio.run(service.search_with_context("install", SEARCH_CONTEXT))
+    second = asyncio.run(service.search_with_context("build", SEARCH_CONTEXT))
+
+    assert len(service.queried) == 2
+    assert first[0]['content'] != second[0]['content']
+
+
+def test_repeated_question_is_served_from_cache(service):
+    first = asyncio.run(service.search_with_context("install", SEARCH_CONTEXT))
+    again = asyncio.run(service.search_with_context("Install", SEARCH_CONTEXT))
+
+    assert len(service.queried) == 1
+    assert again == first
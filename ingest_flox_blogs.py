@@ -4,66 +4,80 @@ Flox Blog Ingestion Script
 Downloads and processes all Flox blog posts for the knowledge base
 """
 
+import asyncio
+import importlib.util
 import os
 import sys
-import requests
-from bs4 import BeautifulSoup
+import httpx
+from selectolax.lexbor import LexborHTMLParser
 import json
 from pathlib import Path
-import time
 import re
 
 # Add backend to path
 sys.path.insert(0, 'backend')
 
+# Posts downloaded at once, and the pause each worker takes between requests.
+# Kept close to the original one-request-per-second crawl; override with
+# FLOX_BLOG_CONCURRENCY / FLOX_BLOG_REQUEST_DELAY if flox.dev allows more.
+MAX_CONCURRENT_DOWNLOADS = max(1, int(os.getenv("FLOX_BLOG_CONCURRENCY", "2")))
+REQUEST_DELAY_SECONDS = max(0.0, float(os.getenv("FLOX_BLOG_REQUEST_DELAY", "1.0")))
+
+# HTTP/2 needs the optional h2 package (pip install 'httpx[http2]'); HTTP/1.1 keep-alive otherwise
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Selectors for post metadata (class names containing date/time or tag/category)
+DATE_SELECTOR = 'time[class*=date], time[class*=time], span[class*=date], span[class*=time]'
+TAG_SELECTOR = 'a[class*=tag], a[class*=category], span[class*=tag], span[class*=category]'
+DATE_RE = re.compile(r'\d{1,2}\s+\w+\s+\d{4}')
+
+# Text cleanup
+WS_RE = re.compile(r'\s+')
+ENTITY_RE = re.compile(r'&(nbsp|amp|lt|gt|quot);')
+ENTITY_TABLE = {'nbsp': ' ', 'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"'}
+
+# Filename sanitizing
+SAFE_NONWORD_RE = re.compile(r'[^\w\s-]')
+SAFE_DASH_RE = re.compile(r'[-\s]+')
+
 def clean_text(text):
     """Clean and normalize text content"""
     if not text:
         return ""
     
     # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
-    # Remove HTML entities
-    text = text.replace('&nbsp;', ' ')
-    text = text.replace('&amp;', '&')
-    text = text.replace('&lt;', '<')
-    text = text.replace('&gt;', '>')
-    text = text.replace('&quot;', '"')
+    text = WS_RE.sub(' ', text)
+    # Remove HTML entities in one pass
+    text = ENTITY_RE.sub(lambda m: ENTITY_TABLE[m.group(1)], text)
     
     return text.strip()
 
-def extract_blog_posts():
+async def extract_blog_posts(client):
     """Extract blog post URLs and metadata from the main blog page"""
     print("🔍 Extracting blog post URLs from Flox blog...")
     
     try:
-        response = requests.get('https://flox.dev/blog/', timeout=30)
+        response = await client.get('https://flox.dev/blog/')
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        posts = []
+        tree = LexborHTMLParser(response.content)
+        posts = {}  # url -> post; first link to each URL wins, in page order
         
         # Look for blog post links
-        for link in soup.find_all('a', href=True):
-            href = link['href']
+        for link in tree.css('a[href]'):
+            href = link.attributes['href']
             if '/blog/' in href and href != '/blog/':
                 # Extract title
-                title = link.get_text(strip=True)
+                title = link.text(strip=True)
                 if title and len(title) > 10:  # Filter out short/empty titles
-                    posts.append({
-                        'url': f"https://flox.dev{href}" if href.startswith('/') else href,
+                    url = f"https://flox.dev{href}" if href.startswith('/') else href
+                    posts.setdefault(url, {
+                        'url': url,
                         'title': title,
                         'date': None  # Will extract from individual posts
                     })
         
-        # Remove duplicates
-        seen_urls = set()
-        unique_posts = []
-        for post in posts:
-            if post['url'] not in seen_urls:
-                seen_urls.add(post['url'])
-                unique_posts.append(post)
-        
+        unique_posts = list(posts.values())
         print(f"✅ Found {len(unique_posts)} blog posts")
         return unique_posts
         
@@ -71,47 +85,45 @@ def extract_blog_posts():
         print(f"❌ Error extracting blog posts: {e}")
         return []
 
-def download_blog_post(post_url, title):
+async def download_blog_post(client, post_url, title):
     """Download and parse a single blog post"""
     try:
         print(f"📄 Downloading: {title}")
-        response = requests.get(post_url, timeout=30)
+        response = await client.get(post_url)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.content, 'html.parser')
+        tree = LexborHTMLParser(response.content)
         
         # Extract content
         content = ""
         
         # Try to find main content area
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+        main_content = tree.css_first('main') or tree.css_first('article') or tree.css_first('div.content')
         if main_content:
             # Remove script and style elements
-            for script in main_content(["script", "style"]):
+            for script in main_content.css('script, style'):
                 script.decompose()
             
-            content = main_content.get_text(separator='\n', strip=True)
+            content = main_content.text(separator='\n', strip=True)
         else:
             # Fallback: get all text
-            content = soup.get_text(separator='\n', strip=True)
+            content = (tree.body or tree.root).text(separator='\n', strip=True)
         
         # Clean content
         content = clean_text(content)
         
         # Extract date if possible
         date = None
-        date_elements = soup.find_all(['time', 'span'], class_=re.compile(r'date|time'))
-        for elem in date_elements:
-            date_text = elem.get_text(strip=True)
-            if re.match(r'\d{1,2}\s+\w+\s+\d{4}', date_text):
+        for elem in tree.css(DATE_SELECTOR):
+            date_text = elem.text(strip=True)
+            if DATE_RE.match(date_text):
                 date = date_text
                 break
         
         # Extract tags/categories
         tags = []
-        tag_elements = soup.find_all(['a', 'span'], class_=re.compile(r'tag|category'))
-        for elem in tag_elements:
-            tag_text = elem.get_text(strip=True)
+        for elem in tree.css(TAG_SELECTOR):
+            tag_text = elem.text(strip=True)
             if tag_text and len(tag_text) < 50:  # Reasonable tag length
                 tags.append(tag_text)
         
@@ -134,8 +146,8 @@ def save_blog_post(post_data, output_dir):
         return
     
     # Create safe filename
-    safe_title = re.sub(r'[^\w\s-]', '', post_data['title'])
-    safe_title = re.sub(r'[-\s]+', '-', safe_title)
+    safe_title = SAFE_NONWORD_RE.sub('', post_data['title'])
+    safe_title = SAFE_DASH_RE.sub('-', safe_title)
     filename = f"{safe_title[:50]}.md"
     filepath = output_dir / filename
     
@@ -157,6 +169,42 @@ def save_blog_post(post_data, output_dir):
     
     print(f"💾 Saved: {filename}")
 
+async def process_posts(client, posts, output_dir):
+    """Download and save posts concurrently, at most MAX_CONCURRENT_DOWNLOADS at a time"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    
+    async def process_post(i, post):
+        async with semaphore:
+            print(f"\n[{i}/{len(posts)}] Processing: {post['title']}")
+            
+            post_data = await download_blog_post(client, post['url'], post['title'])
+            if post_data:
+                await asyncio.to_thread(save_blog_post, post_data, output_dir)
+            
+            # Be respectful to the server
+            await asyncio.sleep(REQUEST_DELAY_SECONDS)
+            return post_data is not None
+    
+    results = await asyncio.gather(*(process_post(i, post) for i, post in enumerate(posts, 1)))
+    return sum(results)
+
+async def fetch_posts(output_dir):
+    """Find and download all posts over one shared keep-alive connection pool"""
+    limits = httpx.Limits(max_connections=MAX_CONCURRENT_DOWNLOADS,
+                          max_keepalive_connections=MAX_CONCURRENT_DOWNLOADS)
+    async with httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=30, limits=limits,
+                                 follow_redirects=True) as client:
+        # Extract blog post URLs
+        posts = await extract_blog_posts(client)
+        if not posts:
+            return posts, 0
+        
+        print(f"\n📚 Processing {len(posts)} blog posts ({MAX_CONCURRENT_DOWNLOADS} at a time)...")
+        
+        # Download and process the posts concurrently
+        successful = await process_posts(client, posts, output_dir)
+        return posts, successful
+
 def main():
     """Main ingestion process"""
     print("🚀 Starting Flox Blog Ingestion")
@@ -166,27 +214,11 @@ def main():
     output_dir = Path('data/flox_docs/blogs')
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Extract blog post URLs
-    posts = extract_blog_posts()
+    posts, successful = asyncio.run(fetch_posts(output_dir))
     if not posts:
         print("❌ No blog posts found")
         return
     
-    print(f"\n📚 Processing {len(posts)} blog posts...")
-    
-    # Download and process each post
-    successful = 0
-    for i, post in enumerate(posts, 1):
-        print(f"\n[{i}/{len(posts)}] Processing: {post['title']}")
-        
-        post_data = download_blog_post(post['url'], post['title'])
-        if post_data:
-            save_blog_post(post_data, output_dir)
-            successful += 1
-        
-        # Be respectful to the server
-        time.sleep(1)
-    
     print(f"\n✅ Ingestion complete!")
     print(f"   📄 Successfully processed: {successful}/{len(posts)} posts")
     print(f"   📁 Saved to: {output_dir}")
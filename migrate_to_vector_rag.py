@@ -86,9 +86,11 @@ async def test_vector_search():
         "cross-platform development"
     ]
     
-    for query in test_queries:
+    # Embed and search all test queries in one batch
+    all_results = await vector_service.search_many(test_queries, n_results=2)
+    
+    for query, results in zip(test_queries, all_results):
         print(f"\n🔍 Query: '{query}'")
-        results = await vector_service.search(query, n_results=2)
         print(f"   Found {len(results)} results")
         
         for i, result in enumerate(results, 1):
@@ -6,28 +6,39 @@ import sys
 import os
 sys.path.insert(0, 'backend')
 
-from backend.app.services.rag_service import FloxRAGService
+from backend.app.services.rag_service import get_shared_rag_service
 from backend.app.core.config import get_settings
 import asyncio
 
+# uvloop's libuv-based event loop is faster where available (not on Windows)
+try:
+    import uvloop
+    run = uvloop.run
+except ImportError:
+    run = asyncio.run
+
 async def test_rag_blog_loading():
     """Test if blog posts are loaded into RAG system"""
     print("🧪 Testing RAG Blog Post Loading")
     print("=" * 50)
     
     # Initialize RAG service
-    rag_service = FloxRAGService()
-    await rag_service.initialize()
+    rag_service = await get_shared_rag_service()
+    await rag_service.wait_until_loaded()
     
-    print(f"📚 Total documents loaded: {len(rag_service.documents)}")
+    stats = await rag_service.vector_service.get_collection_stats()
+    print(f"📚 Total chunks loaded: {stats.get('total_chunks', 0)}")
     
     # Check for blog posts specifically
-    blog_docs = [doc for doc in rag_service.documents if 'blogs' in doc.get('path', '')]
-    print(f"📰 Blog documents found: {len(blog_docs)}")
+    blog_docs = await rag_service.vector_service.get_docs_by_subdir('blogs')
+    print(f"📰 Blog chunks loaded: {len(blog_docs)} from {len({doc['path'] for doc in blog_docs})} posts")
+    
+    blog_chunks = await rag_service.vector_service.search("build and publish", n_results=10, doc_types=['blog_post'])
+    print(f"📰 Blog chunks found: {len(blog_chunks)}")
     
-    for doc in blog_docs:
-        print(f"   - {doc['source']} ({doc.get('type', 'unknown')})")
-        if 'build' in doc['content'].lower() and 'publish' in doc['content'].lower():
+    for chunk in blog_chunks:
+        print(f"   - {chunk['source']} ({chunk['doc_type']})")
+        if 'build' in chunk['content'].lower() and 'publish' in chunk['content'].lower():
             print(f"     ✅ Contains 'build and publish' content")
     
     # Test search for "build and publish"
@@ -41,4 +52,4 @@ async def test_rag_blog_loading():
         print()
 
 if __name__ == "__main__":
-    asyncio.run(test_rag_blog_loading())
+    run(test_rag_blog_loading())
@@ -6,26 +6,36 @@ import sys
 import os
 sys.path.insert(0, 'backend')
 
-from backend.app.services.rag_service import FloxRAGService
+from backend.app.services.rag_service import get_shared_rag_service
 import asyncio
 
+# uvloop's libuv-based event loop is faster where available (not on Windows)
+try:
+    import uvloop
+    run = uvloop.run
+except ImportError:
+    run = asyncio.run
+
 async def test_rag():
     print("🧪 Testing Current RAG System")
     print("=" * 50)
     
     # Initialize RAG service
-    rag = FloxRAGService()
-    await rag.initialize()
+    rag = await get_shared_rag_service()
+    await rag.wait_until_loaded()
     
-    print(f"📚 Total documents loaded: {len(rag.documents)}")
+    stats = await rag.vector_service.get_collection_stats()
+    print(f"📚 Total chunks loaded: {stats.get('total_chunks', 0)}")
     
     # Check for blog posts
-    blog_docs = [doc for doc in rag.documents if 'blogs' in doc.get('path', '')]
-    print(f"📰 Blog documents: {len(blog_docs)}")
+    blog_docs = await rag.vector_service.get_docs_by_subdir('blogs')
+    print(f"📰 Blog chunks: {len(blog_docs)} from {len({doc['path'] for doc in blog_docs})} posts")
+    
+    # Run both test searches in one batch
+    results, results2 = await rag.batch_search(["build and publish", "flox build"])
     
     # Test search for "build and publish"
     print("\n🔍 Testing search for 'build and publish'...")
-    results = await rag.search("build and publish")
     print(f"   Found {len(results)} results")
     
     for i, result in enumerate(results, 1):
@@ -36,13 +46,17 @@ async def test_rag():
     
     # Test search for "flox build"
     print("\n🔍 Testing search for 'flox build'...")
-    results2 = await rag.search("flox build")
     print(f"   Found {len(results2)} results")
     
     for i, result in enumerate(results2[:3], 1):
         print(f"   {i}. {result['source']} (score: {result['relevance_score']:.2f})")
         print(f"      Content: {result['content'][:150]}...")
         print()
+    
+    # Show how often repeated queries were served from cache
+    query_cache = rag.get_cache_stats()['query_cache']
+    print(f"🗄️  Query cache: {query_cache['hits']} hits, {query_cache['misses']} misses "
+          f"(hit rate {query_cache['hit_rate']:.0%})")
 
 if __name__ == "__main__":
-    asyncio.run(test_rag())
+    run(test_rag())
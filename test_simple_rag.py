@@ -10,13 +10,39 @@ sys.path.insert(0, 'backend')
 print("🧪 Testing RAG Blog Loading")
 print("=" * 50)
 
+import mmap
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 docs_path = Path("data/flox_docs")
 print(f"📁 Docs path: {docs_path}")
 print(f"📁 Exists: {docs_path.exists()}")
 
+# Files scanned concurrently when checking blog post content
+MAX_READ_WORKERS = 32
+
+# Case-insensitive byte patterns, searched directly in the mapped file
+BUILD_RE = re.compile(rb'build', re.IGNORECASE)
+PUBLISH_RE = re.compile(rb'publish', re.IGNORECASE)
+
+def scan_file(path):
+    """Check a file for 'build' and 'publish' without copying it into a str
+    
+    Returns (path, contains_both, size_in_bytes, error).
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:  # mmap can't map an empty file
+                return path, False, 0, None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                found = BUILD_RE.search(mm) is not None and PUBLISH_RE.search(mm) is not None
+        return path, found, size, None
+    except Exception as e:
+        return path, False, 0, e
+
 if docs_path.exists():
     md_files = list(docs_path.rglob("*.md"))
     print(f"📄 Total .md files: {len(md_files)}")
@@ -26,19 +52,21 @@ if docs_path.exists():
     
     for blog_file in blog_files:
         print(f"   - {blog_file.name}")
-        if 'build' in blog_file.name.lower() and 'publish' in blog_file.name.lower():
-            print(f"     ✅ Found build and publish blog post!")
+    
+    # Scan every build-and-publish post in parallel instead of one at a time
+    build_publish_files = [f for f in blog_files
+                           if 'build' in f.name.lower() and 'publish' in f.name.lower()]
+    with ThreadPoolExecutor(max_workers=MAX_READ_WORKERS) as executor:
+        for blog_file, found, size, error in executor.map(scan_file, build_publish_files):
+            print(f"   ✅ Found build and publish blog post: {blog_file.name}")
             
             # Check content
-            try:
-                with open(blog_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if 'build' in content.lower() and 'publish' in content.lower():
-                        print(f"     ✅ Content contains 'build and publish'")
-                        print(f"     📊 Content length: {len(content)} characters")
-                    else:
-                        print(f"     ❌ Content doesn't contain 'build and publish'")
-            except Exception as e:
-                print(f"     ❌ Error reading file: {e}")
+            if error is not None:
+                print(f"     ❌ Error reading file: {error}")
+            elif found:
+                print(f"     ✅ Content contains 'build and publish'")
+                print(f"     📊 Content length: {size} bytes")
+            else:
+                print(f"     ❌ Content doesn't contain 'build and publish'")
 else:
     print("❌ Docs path doesn't exist")